@@ -28,6 +28,8 @@ import requests
 from bs4 import BeautifulSoup
 import threading
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 
 # New imports for enhanced features
 from database import init_db, SessionLocal, get_db
@@ -47,7 +49,8 @@ from routers import (
     search_router,
 )
 from repair_routes import router as repair_router
-from probe_routes import router as probe_router
+from probe_routes import router as probe_router, create_paper_client
+from mod_sources import close_spiget_client
 from maintenance_routes import router as maintenance_router
 from steam_routes import router as steam_router
 from steam_mods_routes import router as steam_mods_router
@@ -59,7 +62,7 @@ from analytics_routes import router as analytics_router
 from multi_server_routes import router as multi_server_router
 from mods_enhanced_routes import router as mods_enhanced_router
 from backup_advanced_routes import router as backup_advanced_router
-from player_enhanced_routes import router as player_enhanced_router
+from player_enhanced_routes import router as player_enhanced_router, start_ban_expiry_worker, stop_ban_expiry_worker
 # Quality of Life Features routers
 from ui_enhancements_routes import router as ui_enhancements_router
 from config_management_routes import router as config_management_router
@@ -278,11 +281,27 @@ if os.getenv("ENABLE_DEBUG_ENDPOINTS", "0") == "1":
         }
 
 
+_log_listener: Optional[QueueListener] = None
+
+
+def _install_queue_logging():
+    """Hand root log records to a background listener so request paths never block on log I/O."""
+    global _log_listener
+    root = logging.getLogger()
+    if _log_listener is not None or not root.handlers:
+        return
+    log_queue = queue.SimpleQueue()
+    _log_listener = QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    root.handlers = [QueueHandler(log_queue)]
+    _log_listener.start()
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize the application when it starts."""
     print("Starting up application...")
     logging.basicConfig(level=logging.INFO)
+    _install_queue_logging()
     try:
         # Initialize database
         print("Initializing database...")
@@ -325,6 +344,13 @@ async def startup_event():
         # Start backup scheduler
         start_backup_scheduler()
         logging.info("Backup scheduler started")
+
+        # Start temporary ban expiry worker
+        start_ban_expiry_worker()
+        logging.info("Ban expiry worker started")
+
+        # Shared keep-alive client for PaperMC probes
+        app.state.paper_client = create_paper_client()
         
     except Exception as e:
         logging.error(f"Error during startup: {e}")
@@ -343,6 +369,15 @@ async def shutdown_event():
         # Stop backup scheduler
         stop_backup_scheduler()
         logging.info("Backup scheduler stopped")
+        # Stop ban expiry worker
+        stop_ban_expiry_worker()
+        logging.info("Ban expiry worker stopped")
+        paper_client = getattr(app.state, "paper_client", None)
+        if paper_client is not None:
+            await paper_client.aclose()
+        await close_spiget_client()
+        if _log_listener is not None:
+            _log_listener.stop()
         
     except Exception as e:
         logging.error(f"Error during shutdown: {e}")
@@ -24,6 +24,7 @@ engine_kwargs = {
     "pool_timeout": 60,  
     "pool_recycle": 3600,  
     "pool_pre_ping": True,  
+    "query_cache_size": 1200,  
     "echo": False  
 }
 
@@ -131,8 +132,19 @@ def cleanup_expired_sessions():
         print(f"Error during connection cleanup: {e}")
 
 
+# Set by init_db once uq_profile_server_player is known to exist; profile
+# upserts fall back to select-then-insert until then
+_profile_unique_index = False
+
+
+def profile_upserts_enabled() -> bool:
+    """Whether player_profiles has the unique index ON CONFLICT upserts need."""
+    return _profile_unique_index
+
+
 def init_db():
     """Initialize the database and create tables."""
+    global _profile_unique_index
     
     
     import models  
@@ -154,10 +166,76 @@ def init_db():
             conn.execute(_text("CREATE INDEX IF NOT EXISTS idx_audit_logs_timestamp ON audit_logs (timestamp)"))
             conn.execute(_text("CREATE INDEX IF NOT EXISTS idx_audit_logs_user_id ON audit_logs (user_id)"))
             conn.execute(_text("CREATE INDEX IF NOT EXISTS idx_audit_logs_action ON audit_logs (action)"))
-        print("Database indexes ensured for audit_logs")
+            conn.execute(_text("CREATE INDEX IF NOT EXISTS idx_usage_records_org_recorded ON usage_records (organization_id, recorded_at, id)"))
+            conn.execute(_text("CREATE INDEX IF NOT EXISTS ix_profile_server_last_seen ON player_profiles (server_name, last_seen)"))
+            conn.execute(_text("CREATE INDEX IF NOT EXISTS ix_tempban_active_expires ON temporary_bans (server_name, is_active, expires_at)"))
+            conn.execute(_text("CREATE INDEX IF NOT EXISTS ix_pa_server_performed ON player_actions (server_name, performed_at)"))
+            conn.execute(_text("CREATE INDEX IF NOT EXISTS ix_pa_lookup ON player_actions (server_name, player_name, action_type, is_active)"))
+            conn.execute(_text("DROP INDEX IF EXISTS ix_notifications_user_read"))
+            conn.execute(_text("CREATE INDEX IF NOT EXISTS ix_notifications_user_read_created ON notifications (user_id, is_read, created_at DESC)"))
+        print("Database indexes ensured")
     except Exception as e:
         print(f"Warning: could not create indexes (non-fatal): {e}")
     
+    # Player profile upserts rely on this; kept separate since legacy databases
+    # may hold duplicate rows that need manual cleanup first
+    try:
+        from sqlalchemy import text as _text, inspect as _inspect
+        inspector = _inspect(engine)
+        profile_key = ["server_name", "player_name"]
+        # Fresh databases already have it from the model's UniqueConstraint (SQLite
+        # backs that with an unnamed autoindex); a second index would only slow writes
+        has_unique = any(
+            c["column_names"] == profile_key for c in inspector.get_unique_constraints("player_profiles")
+        ) or any(
+            i["unique"] and i["column_names"] == profile_key for i in inspector.get_indexes("player_profiles")
+        )
+        if not has_unique:
+            with engine.begin() as conn:
+                conn.execute(_text("CREATE UNIQUE INDEX IF NOT EXISTS uq_profile_server_player ON player_profiles (server_name, player_name)"))
+        _profile_unique_index = True
+    except Exception as e:
+        print(f"Warning: could not create player_profiles unique index (non-fatal): {e}")
+    
+    # One installation / review per (plugin, user); same caveat about legacy duplicates
+    try:
+        from sqlalchemy import text as _text
+        with engine.begin() as conn:
+            conn.execute(_text("CREATE UNIQUE INDEX IF NOT EXISTS ix_plug_inst_plugin_user ON plugin_installations (plugin_id, user_id)"))
+            conn.execute(_text("CREATE UNIQUE INDEX IF NOT EXISTS ix_plug_review_plugin_user ON plugin_reviews (plugin_id, user_id)"))
+    except Exception as e:
+        print(f"Warning: could not create plugin unique indexes (non-fatal): {e}")
+    
+    # plugins.rating_sum was added after the table shipped; add and backfill it once
+    try:
+        from sqlalchemy import text as _text, inspect as _inspect
+        plugin_columns = {c["name"] for c in _inspect(engine).get_columns("plugins")}
+        if "rating_sum" not in plugin_columns:
+            with engine.begin() as conn:
+                conn.execute(_text("ALTER TABLE plugins ADD COLUMN rating_sum INTEGER NOT NULL DEFAULT 0"))
+                conn.execute(_text(
+                    "UPDATE plugins SET rating_sum = "
+                    "(SELECT COALESCE(SUM(rating), 0) FROM plugin_reviews WHERE plugin_reviews.plugin_id = plugins.id)"
+                ))
+            print("Added plugins.rating_sum column")
+    except Exception as e:
+        print(f"Warning: could not add plugins.rating_sum column (non-fatal): {e}")
+    
+    # users.unread_notifications_count was added later too; backfill from notifications
+    try:
+        from sqlalchemy import text as _text, inspect as _inspect
+        user_columns = {c["name"] for c in _inspect(engine).get_columns("users")}
+        if "unread_notifications_count" not in user_columns:
+            with engine.begin() as conn:
+                conn.execute(_text("ALTER TABLE users ADD COLUMN unread_notifications_count INTEGER NOT NULL DEFAULT 0"))
+                conn.execute(_text(
+                    "UPDATE users SET unread_notifications_count = "
+                    "(SELECT COUNT(*) FROM notifications WHERE notifications.user_id = users.id AND notifications.is_read = false)"
+                ))
+            print("Added users.unread_notifications_count column")
+    except Exception as e:
+        print(f"Warning: could not add users.unread_notifications_count column (non-fatal): {e}")
+    
     
     db = SessionLocal()
     try:
@@ -3258,6 +3258,54 @@ class DockerManager:
             logger.error(f"Fehler beim Senden des Befehls an Container {container_id}: {e}")
             return {"exit_code": 1, "output": f"Error: {e}", "method": "error"}
 
+    def send_commands(self, container_id: str, commands: List[str]) -> List[dict]:
+        """
+        Send several commands to a game server container in one round-trip.
+        Reuses a single RCON session (or a single attach_socket write) for the
+        whole batch and only falls back to per-command send_command otherwise.
+        Returns one result dict per command, in order.
+        """
+        if not commands:
+            return []
+        container = self._get_container_any(container_id)
+
+        try:
+            rcon_cfg = self._detect_rcon_config(container)
+            rcon_port = rcon_cfg["port"]
+
+            if rcon_cfg["enabled"] and rcon_cfg["password"] and rcon_port:
+                try:
+                    results = []
+                    with MCRcon(rcon_cfg["host"], rcon_cfg["password"], port=rcon_port) as mcr:
+                        for command in commands:
+                            try:
+                                response = mcr.command(command)
+                                results.append({"exit_code": 0, "output": response, "method": "rcon", "rcon_port": rcon_port})
+                            except Exception as cmd_err:
+                                results.append({"exit_code": 1, "output": f"Error: {cmd_err}", "method": "rcon", "rcon_port": rcon_port})
+                    return results
+                except Exception as rcon_err:
+                    logger.warning(f"RCON fehlgeschlagen für Container {container_id}: {rcon_err}")
+
+            try:
+                sock = container.attach_socket(params={
+                    "stdin": True,
+                    "stdout": True,
+                    "stderr": True,
+                    "stream": True
+                })
+                sock._sock.setblocking(True)
+                payload = "".join(command.lstrip("/").strip() + "\n" for command in commands)
+                sock._sock.sendall(payload.encode("utf-8"))
+                sock.close()
+                return [{"exit_code": 0, "output": "", "method": "attach_socket"} for _ in commands]
+            except Exception as attach_err:
+                logger.warning(f"attach_socket fehlgeschlagen für Container {container_id}: {attach_err}")
+        except Exception as e:
+            logger.error(f"Fehler beim Senden der Befehle an Container {container_id}: {e}")
+
+        return [self.send_command(container_id, command) for command in commands]
+
     def get_server_stats(self, container_id: str) -> dict:
         """
         Returns CPU %, RAM usage (MB), network I/O (MB), uptime, restarts, and health for the given container.
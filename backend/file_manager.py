@@ -39,6 +39,11 @@ def _invalidate_cache(name: str, rel: str | None = None) -> None:
         _DIR_CACHE.pop(k, None)
 
 
+def invalidate_cache(name: str) -> None:
+    """Drop cached directory listings for a server after writing outside this module."""
+    _invalidate_cache(name)
+
+
 def list_dir(name: str, rel: str = ".") -> List[dict]:
     base = _server_path(name)
     target = _safe_join(base, rel)
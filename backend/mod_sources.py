@@ -309,9 +309,11 @@ class CurseForgeClient:
 class SpigetClient:
     """Client for Spiget API - SpigotMC resources."""
     
-    def __init__(self):
+    def __init__(self, http: Optional[httpx.AsyncClient] = None):
         self.base_url = SPIGET_API
         self.headers = {"User-Agent": USER_AGENT}
+        # Optional shared client; without one each request opens its own connection
+        self.http = http
     
     async def search(
         self,
@@ -323,14 +325,15 @@ class SpigetClient:
         # Spiget uses page-based pagination
         page = (offset // limit) + 1
         
-        async with httpx.AsyncClient(timeout=15) as client:
-            resp = await client.get(
-                f"{self.base_url}/search/resources/{query}",
-                params={"size": limit, "page": page},
-                headers=self.headers,
-            )
-            resp.raise_for_status()
-            data = resp.json()
+        url = f"{self.base_url}/search/resources/{query}"
+        params = {"size": limit, "page": page}
+        if self.http is not None:
+            resp = await self.http.get(url, params=params, headers=self.headers)
+        else:
+            async with httpx.AsyncClient(timeout=15) as client:
+                resp = await client.get(url, params=params, headers=self.headers)
+        resp.raise_for_status()
+        data = resp.json()
         
         results = []
         for resource in data:
@@ -371,6 +374,27 @@ class SpigetClient:
         return f"{self.base_url}/resources/{resource_id}/download"
 
 
+_spiget_client: Optional[SpigetClient] = None
+
+
+def get_spiget_client() -> SpigetClient:
+    """Shared Spiget client whose connection pool is reused across requests."""
+    global _spiget_client
+    if _spiget_client is None:
+        _spiget_client = SpigetClient(httpx.AsyncClient(
+            timeout=15,
+            limits=httpx.Limits(max_keepalive_connections=10),
+        ))
+    return _spiget_client
+
+
+async def close_spiget_client() -> None:
+    global _spiget_client
+    if _spiget_client is not None and _spiget_client.http is not None:
+        await _spiget_client.http.aclose()
+    _spiget_client = None
+
+
 # Download helper
 async def download_mod_to_server(
     url: str,
@@ -466,7 +490,7 @@ async def search_plugins(
 ) -> dict:
     """Search for plugins from specified source."""
     if source == "spiget":
-        client = SpigetClient()
+        client = get_spiget_client()
         return await client.search(query, limit, offset)
     else:
         client = ModrinthClient()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, JSON, Float
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, JSON, Float, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -47,6 +47,9 @@ class User(Base):
     
     preferences = Column(JSON, default=dict)
     
+    # Maintained alongside Notification writes so the UI never has to COUNT(*)
+    unread_notifications_count = Column(Integer, default=0, nullable=False, server_default="0")
+    
     
     scheduled_tasks = relationship("ScheduledTask", back_populates="created_by_user")
     audit_logs = relationship("AuditLog", back_populates="user")
@@ -171,6 +174,10 @@ class ServerPerformance(Base):
 
 class PlayerAction(Base):
     __tablename__ = "player_actions"
+    __table_args__ = (
+        Index("ix_pa_server_performed", "server_name", "performed_at"),
+        Index("ix_pa_lookup", "server_name", "player_name", "action_type", "is_active"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     server_name = Column(String, nullable=False)
@@ -389,6 +396,7 @@ class Plugin(Base):
     download_count = Column(Integer, default=0)
     average_rating = Column(Float, default=0.0)
     review_count = Column(Integer, default=0)
+    rating_sum = Column(Integer, default=0, nullable=False)  # running total so average_rating updates in O(1)
     is_published = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
@@ -417,6 +425,9 @@ class PluginVersion(Base):
 class PluginInstallation(Base):
     """User plugin installations"""
     __tablename__ = "plugin_installations"
+    __table_args__ = (
+        Index("ix_plug_inst_plugin_user", "plugin_id", "user_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     plugin_id = Column(Integer, ForeignKey("plugins.id"), nullable=False)
@@ -433,6 +444,9 @@ class PluginInstallation(Base):
 class PluginReview(Base):
     """Plugin reviews and ratings"""
     __tablename__ = "plugin_reviews"
+    __table_args__ = (
+        Index("ix_plug_review_plugin_user", "plugin_id", "user_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     plugin_id = Column(Integer, ForeignKey("plugins.id"), nullable=False)
@@ -464,6 +478,13 @@ class Notification(Base):
     user = relationship("User", backref="notifications")
 
 
+# Serves both the per-user listing (newest first) and the unread filter
+Index(
+    "ix_notifications_user_read_created",
+    Notification.user_id, Notification.is_read, Notification.created_at.desc(),
+)
+
+
 # Advanced API Features
 class Task(Base):
     """Long-running task tracking"""
@@ -751,6 +772,10 @@ class BackupHistory(Base):
 class PlayerProfile(Base):
     """Extended player statistics and profiles"""
     __tablename__ = "player_profiles"
+    __table_args__ = (
+        UniqueConstraint("server_name", "player_name", name="uq_profile_server_player"),
+        Index("ix_profile_server_last_seen", "server_name", "last_seen"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     server_name = Column(String, nullable=False, index=True)
@@ -781,6 +806,9 @@ class PlayerProfile(Base):
 class TemporaryBan(Base):
     """Temporary bans with auto-expiration"""
     __tablename__ = "temporary_bans"
+    __table_args__ = (
+        Index("ix_tempban_active_expires", "server_name", "is_active", "expires_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     server_name = Column(String, nullable=False, index=True)
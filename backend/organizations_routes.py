@@ -4,14 +4,16 @@ Teams, resource quotas, billing tracking, organization permissions
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, aliased, joinedload
+from sqlalchemy import and_, or_, func, select, bindparam
 from pydantic import BaseModel, validator
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator
 from datetime import datetime, timedelta
 from enum import Enum
+import orjson
 
-from database import get_db
+from database import get_db, DatabaseSession
 from models import User, Organization, OrganizationMember, ResourceQuota, UsageRecord, OrganizationInvite
 from auth import require_auth, require_admin, get_current_user
 
@@ -27,6 +29,15 @@ class OrganizationRole(str, Enum):
     VIEWER = "viewer"
 
 
+# Role hierarchy used by membership checks; built once at import time
+_ROLE_RANK: Dict[str, int] = {
+    OrganizationRole.VIEWER: 0,
+    OrganizationRole.MEMBER: 1,
+    OrganizationRole.ADMIN: 2,
+    OrganizationRole.OWNER: 3
+}
+
+
 class QuotaType(str, Enum):
     SERVERS = "servers"
     STORAGE = "storage"  # GB
@@ -34,6 +45,34 @@ class QuotaType(str, Enum):
     MONTHLY_COST = "monthly_cost"  # dollars
 
 
+# ==================== Prepared Statements ====================
+# Built once at import so the hot paths only bind parameters; the compiled
+# SQL is then served from the engine's compiled-statement cache.
+
+_MemberCount = aliased(OrganizationMember)
+
+_LIST_ORGS_STMT = select(
+    Organization,
+    OrganizationMember.role,
+    select(func.count(_MemberCount.id))
+    .where(_MemberCount.organization_id == Organization.id)
+    .correlate(Organization)
+    .scalar_subquery()
+).join(
+    OrganizationMember, OrganizationMember.organization_id == Organization.id
+).where(
+    OrganizationMember.user_id == bindparam('uid'),
+    Organization.is_active.is_(True)
+)
+
+_MEMBERSHIP_STMT = select(OrganizationMember).options(
+    joinedload(OrganizationMember.organization)
+).where(
+    OrganizationMember.organization_id == bindparam('org_id'),
+    OrganizationMember.user_id == bindparam('uid')
+)
+
+
 # ==================== Request/Response Models ====================
 
 class OrganizationCreate(BaseModel):
@@ -137,7 +176,7 @@ async def create_organization(
         'id': organization.id,
         'name': organization.name,
         'description': organization.description,
-        'created_at': organization.created_at.isoformat(),
+        'created_at': organization.created_at,
         'role': OrganizationRole.OWNER
     }
 
@@ -149,31 +188,21 @@ async def list_organizations(
 ):
     """List all organizations user belongs to"""
     
-    # Get organizations where user is a member
-    memberships = db.query(OrganizationMember).filter(
-        OrganizationMember.user_id == current_user.id
-    ).all()
+    # Active organizations where user is a member, with member counts
+    rows = db.execute(_LIST_ORGS_STMT, {'uid': current_user.id}).all()
     
-    organizations = []
-    for membership in memberships:
-        org = membership.organization
-        if not org.is_active:
-            continue
-        
-        # Get member count
-        member_count = db.query(OrganizationMember).filter(
-            OrganizationMember.organization_id == org.id
-        ).count()
-        
-        organizations.append({
+    organizations = [
+        {
             'id': org.id,
             'name': org.name,
             'description': org.description,
-            'role': membership.role,
+            'role': role,
             'member_count': member_count,
-            'created_at': org.created_at.isoformat(),
+            'created_at': org.created_at,
             'is_owner': org.owner_id == current_user.id
-        })
+        }
+        for org, role, member_count in rows
+    ]
     
     return {'organizations': organizations}
 
@@ -204,34 +233,24 @@ async def get_organization(
         for q in quotas
     }
     
-    # Get members
-    members = db.query(OrganizationMember).filter(
-        OrganizationMember.organization_id == org_id
-    ).all()
-    
-    member_list = [
-        {
-            'user_id': m.user_id,
-            'username': m.user.username,
-            'email': m.user.email,
-            'role': m.role,
-            'joined_at': m.joined_at.isoformat()
-        }
-        for m in members
-    ]
-    
-    return {
+    details = {
         'id': org.id,
         'name': org.name,
         'description': org.description,
         'billing_email': org.billing_email,
-        'created_at': org.created_at.isoformat(),
+        'created_at': org.created_at,
         'is_active': org.is_active,
         'owner_id': org.owner_id,
         'current_user_role': membership.role,
-        'quotas': quota_dict,
-        'members': member_list
+        'quotas': quota_dict
     }
+    
+    # Members are streamed row-by-row so large organizations don't have to be
+    # materialized in memory before the response starts
+    return StreamingResponse(
+        _stream_organization_members(org_id, details),
+        media_type="application/json"
+    )
 
 
 @router.put("/{org_id}")
@@ -301,19 +320,19 @@ async def invite_member(
     # Check admin permission
     _check_org_membership(db, org_id, current_user.id, min_role=OrganizationRole.ADMIN)
     
-    # Find user by email
-    user = db.query(User).filter(User.email == invite.email).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Check if already member
-    existing = db.query(OrganizationMember).filter(
+    # Find user by email along with any existing membership in one round-trip
+    row = db.query(User, OrganizationMember).outerjoin(
+        OrganizationMember,
         and_(
-            OrganizationMember.organization_id == org_id,
-            OrganizationMember.user_id == user.id
+            OrganizationMember.user_id == User.id,
+            OrganizationMember.organization_id == org_id
         )
-    ).first()
+    ).filter(User.email == invite.email).first()
+    
+    if not row:
+        raise HTTPException(status_code=404, detail="User not found")
     
+    user, existing = row
     if existing:
         raise HTTPException(status_code=400, detail="User already a member")
     
@@ -400,8 +419,8 @@ async def list_invites(
                 'invited_user': inv.invited_user.username,
                 'invited_by': inv.inviter.username,
                 'role': inv.role,
-                'created_at': inv.created_at.isoformat(),
-                'expires_at': inv.expires_at.isoformat()
+                'created_at': inv.created_at,
+                'expires_at': inv.expires_at
             }
             for inv in invites
         ]
@@ -624,10 +643,12 @@ async def get_usage_history(
     end_date: Optional[datetime] = None,
     resource_type: Optional[str] = None,
     limit: int = Query(100, le=1000),
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[int] = None,
     current_user: User = Depends(require_auth),
     db: Session = Depends(get_db)
 ):
-    """Get usage history"""
+    """Get usage history (keyset-paginated via cursor/cursor_id)"""
     
     _check_org_membership(db, org_id, current_user.id)
     
@@ -640,9 +661,28 @@ async def get_usage_history(
     if resource_type:
         query = query.filter(UsageRecord.resource_type == resource_type)
     
-    records = query.order_by(UsageRecord.recorded_at.desc()).limit(limit).all()
+    # Seek past the last row of the previous page instead of using OFFSET
+    if cursor:
+        if cursor_id is not None:
+            query = query.filter(or_(
+                UsageRecord.recorded_at < cursor,
+                and_(UsageRecord.recorded_at == cursor, UsageRecord.id < cursor_id)
+            ))
+        else:
+            query = query.filter(UsageRecord.recorded_at < cursor)
+    
+    records = query.order_by(
+        UsageRecord.recorded_at.desc(),
+        UsageRecord.id.desc()
+    ).limit(limit).all()
+    
+    next_cursor = None
+    if len(records) == limit:
+        last = records[-1]
+        next_cursor = {'cursor': last.recorded_at, 'cursor_id': last.id}
     
     return {
+        'next_cursor': next_cursor,
         'usage_records': [
             {
                 'id': r.id,
@@ -650,7 +690,7 @@ async def get_usage_history(
                 'amount': r.amount,
                 'cost': r.cost,
                 'metadata': r.usage_metadata,
-                'recorded_at': r.recorded_at.isoformat()
+                'recorded_at': r.recorded_at
             }
             for r in records
         ]
@@ -717,6 +757,38 @@ async def get_billing_summary(
 
 # ==================== Helper Functions ====================
 
+def _stream_organization_members(org_id: int, details: Dict[str, Any]) -> Iterator[bytes]:
+    """Yield the organization JSON document, appending members in batches"""
+    
+    yield orjson.dumps(details)[:-1] + b',"members":['
+    
+    with DatabaseSession() as db:
+        rows = db.query(
+            OrganizationMember.user_id,
+            User.username,
+            User.email,
+            OrganizationMember.role,
+            OrganizationMember.joined_at
+        ).join(
+            User, User.id == OrganizationMember.user_id
+        ).filter(
+            OrganizationMember.organization_id == org_id
+        ).yield_per(1000)
+        
+        separator = b''
+        for user_id, username, email, role, joined_at in rows:
+            yield separator + orjson.dumps({
+                'user_id': user_id,
+                'username': username,
+                'email': email,
+                'role': role,
+                'joined_at': joined_at
+            })
+            separator = b','
+    
+    yield b']}'
+
+
 def _check_org_membership(
     db: Session,
     org_id: int,
@@ -725,12 +797,9 @@ def _check_org_membership(
 ) -> OrganizationMember:
     """Check if user is member of organization with minimum role"""
     
-    membership = db.query(OrganizationMember).filter(
-        and_(
-            OrganizationMember.organization_id == org_id,
-            OrganizationMember.user_id == user_id
-        )
-    ).first()
+    membership = db.execute(
+        _MEMBERSHIP_STMT, {'org_id': org_id, 'uid': user_id}
+    ).scalars().first()
     
     if not membership:
         raise HTTPException(status_code=404, detail="Organization not found or access denied")
@@ -739,14 +808,7 @@ def _check_org_membership(
         raise HTTPException(status_code=400, detail="Organization is not active")
     
     # Check role hierarchy
-    role_hierarchy = {
-        OrganizationRole.VIEWER: 0,
-        OrganizationRole.MEMBER: 1,
-        OrganizationRole.ADMIN: 2,
-        OrganizationRole.OWNER: 3
-    }
-    
-    if role_hierarchy[membership.role] < role_hierarchy[min_role]:
+    if _ROLE_RANK[membership.role] < _ROLE_RANK[min_role]:
         raise HTTPException(status_code=403, detail="Insufficient permissions")
     
     return membership
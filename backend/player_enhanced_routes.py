@@ -3,21 +3,30 @@ Player Experience Enhancements
 Bulk whitelist, temporary bans, player statistics, RCON support
 """
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
-from pydantic import BaseModel
-from typing import List, Optional
+from sqlalchemy import and_, func, select, update, cast, extract, literal, Integer, DateTime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from pydantic import BaseModel, TypeAdapter
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
+from pathlib import Path
+import asyncio
 import csv
-import io
-import json
+import heapq
+import logging
+import threading
+import orjson
 
-from database import get_db
+from database import get_db, DatabaseSession, profile_upserts_enabled
 from models import PlayerProfile, TemporaryBan, PlayerSession, User
 from auth import require_auth, require_moderator
 from runtime_adapter import get_runtime_manager_or_docker
 from config import SERVERS_ROOT
+from player_routes import container_id_for
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/player-enhanced", tags=["player_enhanced"])
 
@@ -42,6 +51,24 @@ class PlayerProfileResponse(BaseModel):
         from_attributes = True
 
 
+# Only the columns PlayerProfileResponse needs, validated as one list
+_PROFILE_COLUMNS = (
+    PlayerProfile.id,
+    PlayerProfile.server_name,
+    PlayerProfile.player_name,
+    PlayerProfile.player_uuid,
+    PlayerProfile.first_joined,
+    PlayerProfile.last_seen,
+    PlayerProfile.total_playtime_minutes,
+    PlayerProfile.session_count,
+    PlayerProfile.is_online,
+    PlayerProfile.is_whitelisted,
+    PlayerProfile.is_banned,
+    PlayerProfile.is_op,
+)
+_PROFILE_LIST_ADAPTER = TypeAdapter(List[PlayerProfileResponse])
+
+
 class PlayerStatsResponse(BaseModel):
     player_name: str
     playtime_formatted: str
@@ -70,6 +97,9 @@ class TemporaryBanResponse(BaseModel):
         from_attributes = True
 
 
+_BAN_LIST_ADAPTER = TypeAdapter(List[TemporaryBanResponse])
+
+
 class BulkWhitelistRequest(BaseModel):
     players: List[str]
 
@@ -84,19 +114,75 @@ def get_docker_manager():
     return get_runtime_manager_or_docker()
 
 
-@router.get("/profiles/{server_name}", response_model=List[PlayerProfileResponse])
+def _command_succeeded(result) -> bool:
+    """Whether a send_command(s) result reports success (Docker or local runtime)"""
+    if not isinstance(result, dict):
+        return result is not None
+    if 'ok' in result:
+        return bool(result['ok'])
+    return result.get('exit_code', 0) == 0
+
+
+def _command_error(result) -> str:
+    if isinstance(result, dict):
+        return str(result.get('error') or result.get('output') or 'Command failed')
+    return 'Command failed'
+
+
+def _load_player_file(path: Path) -> List[dict]:
+    """Parse a server JSON list (usercache.json, ops.json, ...); missing or unreadable files yield []"""
+    if not path.exists():
+        return []
+    try:
+        data = orjson.loads(path.read_bytes())
+    except Exception:
+        logger.exception("Error reading %s", path)
+        return []
+    if not isinstance(data, list):
+        return []
+    return [entry for entry in data if isinstance(entry, dict)]
+
+
+def _profile_insert(db: Session):
+    """Dialect-specific INSERT for PlayerProfile that supports ON CONFLICT upserts.
+    Returns None when the bound database has no ON CONFLICT support, or when
+    init_db could not create the (server_name, player_name) unique index.
+    """
+    if not profile_upserts_enabled():
+        return None
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return pg_insert(PlayerProfile)
+    if dialect == "sqlite":
+        return sqlite_insert(PlayerProfile)
+    return None
+
+
+@router.get(
+    "/profiles/{server_name}",
+    response_model=None,
+    responses={200: {"model": List[PlayerProfileResponse]}}
+)
 async def get_player_profiles(
     server_name: str,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
     current_user: User = Depends(require_auth),
     db: Session = Depends(get_db)
 ):
-    """Get all player profiles for a server"""
+    """Get player profiles for a server (optionally paginated)"""
     
-    profiles = db.query(PlayerProfile).filter(
+    query = db.query(*_PROFILE_COLUMNS).filter(
         PlayerProfile.server_name == server_name
-    ).order_by(PlayerProfile.last_seen.desc()).all()
+    ).order_by(PlayerProfile.last_seen.desc())
+    
+    if offset:
+        query = query.offset(offset)
+    if limit:
+        query = query.limit(limit)
     
-    return [PlayerProfileResponse.model_validate(p) for p in profiles]
+    profiles = _PROFILE_LIST_ADAPTER.validate_python([row._asdict() for row in query.all()])
+    return Response(_PROFILE_LIST_ADAPTER.dump_json(profiles), media_type="application/json")
 
 
 @router.get("/stats/{server_name}/{player_name}", response_model=PlayerStatsResponse)
@@ -129,8 +215,7 @@ async def get_player_stats(
         avg_session = profile.total_playtime_minutes / profile.session_count
     
     # Format playtime
-    hours = profile.total_playtime_minutes // 60
-    minutes = profile.total_playtime_minutes % 60
+    hours, minutes = divmod(profile.total_playtime_minutes, 60)
     playtime_formatted = f"{hours}h {minutes}m"
     
     return PlayerStatsResponse(
@@ -157,109 +242,64 @@ async def sync_player_profiles(
     
     synced = 0
     
-    # Read usercache.json
-    usercache_path = server_path / "usercache.json"
-    if usercache_path.exists():
-        try:
-            data = json.loads(usercache_path.read_text(encoding='utf-8', errors='ignore'))
-            for entry in data:
-                player_name = entry.get('name')
-                player_uuid = entry.get('uuid')
-                
-                if not player_name:
-                    continue
-                
-                # Get or create profile
-                profile = db.query(PlayerProfile).filter(
-                    and_(
-                        PlayerProfile.server_name == server_name,
-                        PlayerProfile.player_name == player_name
-                    )
-                ).first()
-                
-                if not profile:
-                    profile = PlayerProfile(
-                        server_name=server_name,
-                        player_name=player_name,
-                        player_uuid=player_uuid
-                    )
-                    db.add(profile)
-                else:
-                    profile.player_uuid = player_uuid
-                
-                synced += 1
-        except Exception as e:
-            print(f"Error reading usercache.json: {e}")
-    
-    # Read whitelist
-    whitelist_path = server_path / "whitelist.json"
-    if whitelist_path.exists():
-        try:
-            data = json.loads(whitelist_path.read_text(encoding='utf-8', errors='ignore'))
-            for entry in data:
-                player_name = entry.get('name')
-                
-                if not player_name:
-                    continue
-                
-                profile = db.query(PlayerProfile).filter(
-                    and_(
-                        PlayerProfile.server_name == server_name,
-                        PlayerProfile.player_name == player_name
-                    )
-                ).first()
-                
-                if profile:
-                    profile.is_whitelisted = True
-        except Exception as e:
-            print(f"Error reading whitelist.json: {e}")
-    
-    # Read ops
-    ops_path = server_path / "ops.json"
-    if ops_path.exists():
-        try:
-            data = json.loads(ops_path.read_text(encoding='utf-8', errors='ignore'))
-            for entry in data:
-                player_name = entry.get('name')
-                
-                if not player_name:
-                    continue
-                
-                profile = db.query(PlayerProfile).filter(
-                    and_(
-                        PlayerProfile.server_name == server_name,
-                        PlayerProfile.player_name == player_name
-                    )
-                ).first()
-                
-                if profile:
-                    profile.is_op = True
-        except Exception as e:
-            print(f"Error reading ops.json: {e}")
-    
-    # Read banned players
-    banned_path = server_path / "banned-players.json"
-    if banned_path.exists():
-        try:
-            data = json.loads(banned_path.read_text(encoding='utf-8', errors='ignore'))
-            for entry in data:
-                player_name = entry.get('name')
-                
-                if not player_name:
-                    continue
-                
-                profile = db.query(PlayerProfile).filter(
-                    and_(
-                        PlayerProfile.server_name == server_name,
-                        PlayerProfile.player_name == player_name
-                    )
-                ).first()
-                
-                if profile:
-                    profile.is_banned = True
-        except Exception as e:
-            print(f"Error reading banned-players.json: {e}")
+    # Load every known profile for this server once instead of per entry
+    existing = {
+        p.player_name: p
+        for p in db.query(PlayerProfile).filter(
+            PlayerProfile.server_name == server_name
+        ).all()
+    }
+    new_profiles = {}
+    
+    def flag_profile(player_name: str, field: str):
+        profile = existing.get(player_name)
+        if profile is not None:
+            setattr(profile, field, True)
+        elif player_name in new_profiles:
+            new_profiles[player_name][field] = True
+    
+    # Read usercache, whitelist, ops and banned players concurrently off the event loop
+    usercache_data, whitelist_data, ops_data, banned_data = await asyncio.gather(
+        asyncio.to_thread(_load_player_file, server_path / "usercache.json"),
+        asyncio.to_thread(_load_player_file, server_path / "whitelist.json"),
+        asyncio.to_thread(_load_player_file, server_path / "ops.json"),
+        asyncio.to_thread(_load_player_file, server_path / "banned-players.json")
+    )
     
+    for entry in usercache_data:
+        player_name = entry.get('name')
+        player_uuid = entry.get('uuid')
+        
+        if not player_name:
+            continue
+        
+        # Get or create profile
+        profile = existing.get(player_name)
+        if profile is not None:
+            profile.player_uuid = player_uuid
+        elif player_name in new_profiles:
+            new_profiles[player_name]['player_uuid'] = player_uuid
+        else:
+            new_profiles[player_name] = {
+                'server_name': server_name,
+                'player_name': player_name,
+                'player_uuid': player_uuid
+            }
+        
+        synced += 1
+    
+    for data, field in (
+        (whitelist_data, 'is_whitelisted'),
+        (ops_data, 'is_op'),
+        (banned_data, 'is_banned')
+    ):
+        for entry in data:
+            player_name = entry.get('name')
+            if player_name:
+                flag_profile(player_name, field)
+    
+    if new_profiles:
+        db.bulk_insert_mappings(PlayerProfile, list(new_profiles.values()))
     db.commit()
     
     return {"message": f"Synced {synced} player profiles"}
@@ -276,46 +316,69 @@ async def bulk_whitelist(
 ):
     """Add multiple players to whitelist at once"""
     
-    manager = get_docker_manager()
-    servers = manager.list_servers()
-    
-    target_server = next((s for s in servers if s.get("name") == server_name), None)
-    if not target_server:
-        raise HTTPException(status_code=404, detail="Server not found")
+    # Order-preserving dedup; blank names are dropped
+    players = list(dict.fromkeys(name.strip() for name in request.players if name and name.strip()))
+    if not players:
+        return {"message": "No players provided", "added": [], "failed": []}
     
-    container_id = target_server.get("id")
-    if not container_id:
-        raise HTTPException(status_code=400, detail="Server container not found")
+    manager = get_docker_manager()
+    container_id = container_id_for(server_name)
     
     added = []
     failed = []
     
-    for player_name in request.players:
-        try:
-            command = f"whitelist add {player_name}"
-            manager.send_command(container_id, command)
+    # Send every whitelist command over a single console/RCON round-trip
+    try:
+        results = manager.send_commands(
+            container_id, [f"whitelist add {player_name}" for player_name in players]
+        )
+    except Exception as e:
+        results = [{'ok': False, 'error': str(e)}] * len(players)
+    
+    for player_name, result in zip(players, results):
+        if _command_succeeded(result):
             added.append(player_name)
-            
-            # Update profile
-            profile = db.query(PlayerProfile).filter(
+        else:
+            failed.append({'player': player_name, 'error': _command_error(result)})
+    
+    # Upsert profiles for every whitelisted player in a single statement
+    stmt = _profile_insert(db) if added else None
+    if stmt is not None:
+        stmt = stmt.values([
+            {
+                'server_name': server_name,
+                'player_name': player_name,
+                'is_whitelisted': True
+            }
+            for player_name in added
+        ])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=['server_name', 'player_name'],
+            set_={'is_whitelisted': True}
+        ))
+    elif added:
+        # No ON CONFLICT support: one IN-query, then update/add in memory
+        existing = {
+            p.player_name: p
+            for p in db.query(PlayerProfile).filter(
                 and_(
                     PlayerProfile.server_name == server_name,
-                    PlayerProfile.player_name == player_name
+                    PlayerProfile.player_name.in_(added)
                 )
-            ).first()
-            
+            ).all()
+        }
+        new_profiles = []
+        for player_name in added:
+            profile = existing.get(player_name)
             if profile:
                 profile.is_whitelisted = True
             else:
-                profile = PlayerProfile(
+                new_profiles.append(PlayerProfile(
                     server_name=server_name,
                     player_name=player_name,
                     is_whitelisted=True
-                )
-                db.add(profile)
-        
-        except Exception as e:
-            failed.append({'player': player_name, 'error': str(e)})
+                ))
+        db.add_all(new_profiles)
     
     db.commit()
     
@@ -338,17 +401,12 @@ async def import_whitelist_csv(
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="File must be CSV format")
     
-    content = await file.read()
-    text = content.decode('utf-8')
-    
-    players = []
-    reader = csv.reader(io.StringIO(text))
-    
-    for row in reader:
-        if row and row[0]:
-            player_name = row[0].strip()
-            if player_name and not player_name.startswith('#'):
-                players.append(player_name)
+    # Read the spooled upload line by line rather than buffering it whole;
+    # first column only, blank lines and '#' comments are skipped
+    await file.seek(0)
+    lines = (line.decode('utf-8') for line in file.file)
+    names = (row[0].strip() for row in csv.reader(lines) if row)
+    players = [name for name in names if name and name[0] != '#']
     
     # Use bulk whitelist endpoint
     request = BulkWhitelistRequest(players=players)
@@ -367,13 +425,7 @@ async def create_temporary_ban(
     """Ban a player temporarily with auto-expiration"""
     
     manager = get_docker_manager()
-    servers = manager.list_servers()
-    
-    target_server = next((s for s in servers if s.get("name") == server_name), None)
-    if not target_server:
-        raise HTTPException(status_code=404, detail="Server not found")
-    
-    container_id = target_server.get("id")
+    container_id = container_id_for(server_name)
     
     # Ban player
     command = f"ban {request.player_name} {request.reason or 'Temporary ban'}"
@@ -406,10 +458,16 @@ async def create_temporary_ban(
     db.commit()
     db.refresh(temp_ban)
     
+    schedule_ban_expiry(server_name, expires_at)
+    
     return TemporaryBanResponse.model_validate(temp_ban)
 
 
-@router.get("/temp-bans/{server_name}", response_model=List[TemporaryBanResponse])
+@router.get(
+    "/temp-bans/{server_name}",
+    response_model=None,
+    responses={200: {"model": List[TemporaryBanResponse]}}
+)
 async def get_temporary_bans(
     server_name: str,
     active_only: bool = True,
@@ -425,7 +483,8 @@ async def get_temporary_bans(
     
     bans = query.order_by(TemporaryBan.banned_at.desc()).all()
     
-    return [TemporaryBanResponse.model_validate(b) for b in bans]
+    validated = _BAN_LIST_ADAPTER.validate_python(bans, from_attributes=True)
+    return Response(_BAN_LIST_ADAPTER.dump_json(validated), media_type="application/json")
 
 
 @router.post("/process-expired-bans/{server_name}")
@@ -437,13 +496,20 @@ async def process_expired_bans(
     """Process and unban expired temporary bans"""
     
     manager = get_docker_manager()
-    servers = manager.list_servers()
+    container_id = container_id_for(server_name)
     
-    target_server = next((s for s in servers if s.get("name") == server_name), None)
-    if not target_server:
-        raise HTTPException(status_code=404, detail="Server not found")
+    unbanned, _ = _unban_expired_bans(db, manager, container_id, server_name)
     
-    container_id = target_server.get("id")
+    return {
+        "message": f"Processed {len(unbanned)} expired bans",
+        "unbanned_players": unbanned
+    }
+
+
+def _unban_expired_bans(db: Session, manager, container_id: str, server_name: str) -> Tuple[List[str], int]:
+    """Pardon and deactivate every expired ban on a server.
+    Returns the unbanned player names and the number of pardons that failed.
+    """
     
     # Find expired bans
     now = datetime.utcnow()
@@ -456,40 +522,148 @@ async def process_expired_bans(
     ).all()
     
     unbanned = []
+    unbanned_ids = []
     
-    for ban in expired_bans:
-        try:
-            # Unban player
-            command = f"pardon {ban.player_name}"
-            manager.send_command(container_id, command)
-            
-            # Update ban record
-            ban.is_active = False
-            ban.unbanned_at = now
-            ban.auto_unbanned = True
-            
-            # Update profile
-            profile = db.query(PlayerProfile).filter(
-                and_(
-                    PlayerProfile.server_name == server_name,
-                    PlayerProfile.player_name == ban.player_name
-                )
-            ).first()
-            
-            if profile:
-                profile.is_banned = False
-            
+    # Pardon everyone in one batch; a failed pardon only skips that player
+    try:
+        results = manager.send_commands(
+            container_id, [f"pardon {ban.player_name}" for ban in expired_bans]
+        ) if expired_bans else []
+    except Exception as e:
+        results = [{'ok': False, 'error': str(e)}] * len(expired_bans)
+    
+    for ban, result in zip(expired_bans, results):
+        if _command_succeeded(result):
             unbanned.append(ban.player_name)
+            unbanned_ids.append(ban.id)
+        else:
+            logger.warning("Error unbanning %s: %s", ban.player_name, _command_error(result))
+    
+    # Update ban records and profiles with one set-based statement each
+    if unbanned_ids:
+        db.query(TemporaryBan).filter(
+            TemporaryBan.id.in_(unbanned_ids)
+        ).update({
+            TemporaryBan.is_active: False,
+            TemporaryBan.unbanned_at: now,
+            TemporaryBan.auto_unbanned: True
+        }, synchronize_session=False)
         
-        except Exception as e:
-            print(f"Error unbanning {ban.player_name}: {e}")
+        db.query(PlayerProfile).filter(
+            and_(
+                PlayerProfile.server_name == server_name,
+                PlayerProfile.player_name.in_(unbanned)
+            )
+        ).update({PlayerProfile.is_banned: False}, synchronize_session=False)
     
     db.commit()
     
-    return {
-        "message": f"Processed {len(unbanned)} expired bans",
-        "unbanned_players": unbanned
-    }
+    return unbanned, len(expired_bans) - len(unbanned)
+
+
+# ==================== Ban Expiry Worker ====================
+# Temporary bans are lifted by a background thread that sleeps until the
+# earliest known expiry, so nobody has to poll process-expired-bans.
+
+_BAN_RETRY_SECONDS = 60
+_BAN_IDLE_WAIT = 300
+
+_ban_heap: List[Tuple[datetime, str]] = []
+_ban_cond = threading.Condition()
+_ban_worker_thread: Optional[threading.Thread] = None
+_ban_worker_running = False
+
+
+def schedule_ban_expiry(server_name: str, expires_at: datetime):
+    """Queue a server for auto-unban processing once expires_at is reached"""
+    entry = (expires_at, server_name)
+    with _ban_cond:
+        if entry not in _ban_heap:
+            heapq.heappush(_ban_heap, entry)
+            _ban_cond.notify()
+
+
+def _process_due_server(server_name: str):
+    manager = get_docker_manager()
+    try:
+        container_id = container_id_for(server_name)
+    except HTTPException as e:
+        # A deleted server's bans can't be lifted; anything else is retried
+        if e.status_code != 404:
+            _schedule_ban_retry(server_name)
+        return
+    
+    with DatabaseSession() as db:
+        _, failed = _unban_expired_bans(db, manager, container_id, server_name)
+        # Only the earliest expiry per server is queued, so queue the next one
+        next_expiry = db.query(func.min(TemporaryBan.expires_at)).filter(
+            and_(
+                TemporaryBan.server_name == server_name,
+                TemporaryBan.is_active == True,
+                TemporaryBan.expires_at > datetime.utcnow()
+            )
+        ).scalar()
+    
+    if next_expiry:
+        schedule_ban_expiry(server_name, next_expiry)
+    if failed:
+        _schedule_ban_retry(server_name)
+
+
+def _schedule_ban_retry(server_name: str):
+    schedule_ban_expiry(server_name, datetime.utcnow() + timedelta(seconds=_BAN_RETRY_SECONDS))
+
+
+def _ban_expiry_loop():
+    """Background thread that lifts temporary bans as they expire."""
+    while _ban_worker_running:
+        with _ban_cond:
+            now = datetime.utcnow()
+            due = []
+            while _ban_heap and _ban_heap[0][0] <= now:
+                due.append(heapq.heappop(_ban_heap)[1])
+            if not due:
+                timeout = _BAN_IDLE_WAIT
+                if _ban_heap:
+                    timeout = min(timeout, (_ban_heap[0][0] - now).total_seconds())
+                _ban_cond.wait(timeout=max(timeout, 0.1))
+                continue
+        
+        for server_name in dict.fromkeys(due):
+            try:
+                _process_due_server(server_name)
+            except Exception:
+                logger.exception("Error processing expired bans for %s", server_name)
+                # The heap entry is already popped; requeue so the bans aren't stranded
+                _schedule_ban_retry(server_name)
+
+
+def start_ban_expiry_worker():
+    """Seed the expiry queue from active bans and start the worker thread."""
+    global _ban_worker_running, _ban_worker_thread
+    if _ban_worker_running:
+        return
+    
+    with DatabaseSession() as db:
+        pending = db.query(
+            TemporaryBan.server_name, func.min(TemporaryBan.expires_at)
+        ).filter(
+            TemporaryBan.is_active == True
+        ).group_by(TemporaryBan.server_name).all()
+    for server_name, expires_at in pending:
+        schedule_ban_expiry(server_name, expires_at)
+    
+    _ban_worker_running = True
+    _ban_worker_thread = threading.Thread(target=_ban_expiry_loop, daemon=True, name="ban-expiry")
+    _ban_worker_thread.start()
+
+
+def stop_ban_expiry_worker():
+    """Stop the ban expiry worker thread."""
+    global _ban_worker_running
+    _ban_worker_running = False
+    with _ban_cond:
+        _ban_cond.notify()
 
 
 # ==================== RCON Support ====================
@@ -504,15 +678,7 @@ async def execute_rcon_command(
     """Execute an RCON command on the server"""
     
     manager = get_docker_manager()
-    servers = manager.list_servers()
-    
-    target_server = next((s for s in servers if s.get("name") == server_name), None)
-    if not target_server:
-        raise HTTPException(status_code=404, detail="Server not found")
-    
-    container_id = target_server.get("id")
-    if not container_id:
-        raise HTTPException(status_code=400, detail="Server container not found")
+    container_id = container_id_for(server_name)
     
     try:
         # Send command via Docker exec (acts as RCON)
@@ -544,16 +710,41 @@ async def record_player_login(
 ):
     """Record a player login session"""
     
+    now = datetime.utcnow()
+    
     # Create session
     session = PlayerSession(
         server_name=server_name,
         player_name=player_name,
+        login_time=now,
         ip_address=ip_address
     )
     
     db.add(session)
     
-    # Update or create profile
+    # Update or create profile in a single upsert where supported
+    stmt = _profile_insert(db)
+    if stmt is not None:
+        db.execute(stmt.values(
+            server_name=server_name,
+            player_name=player_name,
+            first_joined=now,
+            last_seen=now,
+            last_ip=ip_address,
+            is_online=True
+        ).on_conflict_do_update(
+            index_elements=['server_name', 'player_name'],
+            set_={
+                'is_online': True,
+                'last_seen': now,
+                'last_ip': ip_address,
+                'first_joined': func.coalesce(PlayerProfile.first_joined, now),
+                'updated_at': now
+            }
+        ))
+        db.commit()
+        return {"message": "Login recorded"}
+    
     profile = db.query(PlayerProfile).filter(
         and_(
             PlayerProfile.server_name == server_name,
@@ -565,16 +756,16 @@ async def record_player_login(
         profile = PlayerProfile(
             server_name=server_name,
             player_name=player_name,
-            first_joined=datetime.utcnow(),
+            first_joined=now,
             is_online=True
         )
         db.add(profile)
     else:
         if not profile.first_joined:
-            profile.first_joined = datetime.utcnow()
+            profile.first_joined = now
         profile.is_online = True
     
-    profile.last_seen = datetime.utcnow()
+    profile.last_seen = now
     profile.last_ip = ip_address
     
     db.commit()
@@ -591,34 +782,66 @@ async def record_player_logout(
 ):
     """Record a player logout session"""
     
-    # Find most recent session without logout
-    session = db.query(PlayerSession).filter(
-        and_(
-            PlayerSession.server_name == server_name,
-            PlayerSession.player_name == player_name,
-            PlayerSession.logout_time == None
-        )
-    ).order_by(PlayerSession.login_time.desc()).first()
+    now = datetime.utcnow()
     
-    if session:
-        session.logout_time = datetime.utcnow()
-        duration = (session.logout_time - session.login_time).total_seconds() / 60
-        session.duration_minutes = int(duration)
-        
-        # Update profile
-        profile = db.query(PlayerProfile).filter(
+    # Close the most recent open session, then fold it into the profile
+    duration = _close_latest_session(db, server_name, player_name, now)
+    
+    if duration is not None:
+        db.query(PlayerProfile).filter(
             and_(
                 PlayerProfile.server_name == server_name,
                 PlayerProfile.player_name == player_name
             )
-        ).first()
-        
-        if profile:
-            profile.is_online = False
-            profile.last_seen = datetime.utcnow()
-            profile.total_playtime_minutes += session.duration_minutes
-            profile.session_count += 1
+        ).update({
+            PlayerProfile.is_online: False,
+            PlayerProfile.last_seen: now,
+            PlayerProfile.total_playtime_minutes: PlayerProfile.total_playtime_minutes + duration,
+            PlayerProfile.session_count: PlayerProfile.session_count + 1
+        }, synchronize_session=False)
     
     db.commit()
     
     return {"message": "Logout recorded"}
+
+
+def _session_minutes_expr(db: Session, now: datetime):
+    """SQL expression for whole minutes between login_time and now, or None if unsupported"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        elapsed = extract('epoch', literal(now, DateTime) - PlayerSession.login_time)
+        return cast(func.floor(elapsed / 60), Integer)
+    if dialect == "sqlite":
+        elapsed = func.julianday(now) - func.julianday(PlayerSession.login_time)
+        return cast(elapsed * 1440, Integer)
+    return None
+
+
+def _close_latest_session(db: Session, server_name: str, player_name: str, now: datetime) -> Optional[int]:
+    """Set logout_time/duration on the newest open session and return its duration in minutes"""
+    
+    latest = select(PlayerSession.id).where(
+        and_(
+            PlayerSession.server_name == server_name,
+            PlayerSession.player_name == player_name,
+            PlayerSession.logout_time == None
+        )
+    ).order_by(PlayerSession.login_time.desc()).limit(1).scalar_subquery()
+    
+    minutes = _session_minutes_expr(db, now)
+    if minutes is None:
+        session = db.query(PlayerSession).filter(PlayerSession.id == latest).first()
+        if not session:
+            return None
+        session.logout_time = now
+        session.duration_minutes = int((now - session.login_time).total_seconds() / 60)
+        return session.duration_minutes
+    
+    # Duration is computed by the database in the same UPDATE ... RETURNING
+    return db.execute(
+        update(PlayerSession)
+        .where(PlayerSession.id == latest)
+        .values(logout_time=now, duration_minutes=minutes)
+        .returning(PlayerSession.duration_minutes)
+        .execution_options(synchronize_session=False)
+    ).scalar()
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional
@@ -9,7 +9,14 @@ from models import PlayerAction, User
 from auth import require_auth, require_moderator
 from runtime_adapter import get_runtime_manager_or_docker
 from config import SERVERS_ROOT
-import os, json, re, gzip, datetime as _dt
+import os, io, re, sys, gzip, calendar, heapq, threading, time, datetime as _dt
+from collections import deque
+import orjson
+
+try:
+    from isal import igzip as _gzip
+except ImportError:
+    _gzip = gzip
 
 router = APIRouter(prefix="/players", tags=["player_management"])
 
@@ -42,106 +49,271 @@ def get_docker_manager():
     return _manager_cache
 
 
-def _server_dir(server_name: str):
+_CONTAINER_ID_TTL = 2.0
+_NAME_TO_ID: dict[str, Optional[str]] = {}
+_name_to_id_fetched = 0.0
+_NAME_TO_ID_LOCK = threading.Lock()
+
+
+def _resolve_container_id(dm, server_name: str) -> str:
+    """Map a server name to its container id, re-listing servers at most every couple of seconds.
+    Raises 404 when the server is unknown and 400 when it has no container.
+    """
+    global _name_to_id_fetched
+    with _NAME_TO_ID_LOCK:
+        fresh = time.monotonic() - _name_to_id_fetched < _CONTAINER_ID_TTL
+        if not fresh or server_name not in _NAME_TO_ID:
+            servers = dm.list_servers()
+            _NAME_TO_ID.clear()
+            _NAME_TO_ID.update({s["name"]: s.get("id") for s in servers if s.get("name")})
+            _name_to_id_fetched = time.monotonic()
+        if server_name not in _NAME_TO_ID:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Server not found")
+        container_id = _NAME_TO_ID[server_name]
+    if not container_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Server container not found")
+    return container_id
+
+
+_SERVERS_ROOT_RESOLVED = SERVERS_ROOT.resolve()
+_SERVERS_ROOT_PREFIX = str(_SERVERS_ROOT_RESOLVED) + os.sep
+
+
+# Cheap pre-check only: local and imported servers may use any directory name,
+# so this just rejects separators, NUL and dot entries before touching the
+# filesystem. The resolve-and-prefix check below remains the traversal guard.
+_SERVER_NAME_RE = re.compile(r"\A(?!\.{1,2}\Z)[^/\\\x00]{1,64}\Z")
+
+
+_SERVER_DIR_CACHE_MAX = 256
+_SERVER_DIR_CACHE: dict = {}
+
+
+def _resolve_server_dir(server_name: str):
+    """Resolve a server directory under SERVERS_ROOT, or None if the name is invalid or escapes it.
+    Only directories that exist are cached, so unknown names can't fill the cache.
+    """
+    cached = _SERVER_DIR_CACHE.get(server_name)
+    if cached is not None:
+        return cached
+    if not _SERVER_NAME_RE.match(server_name):
+        return None
     try:
-        p = (SERVERS_ROOT / server_name).resolve()
-        if str(p).startswith(str(SERVERS_ROOT.resolve())):
-            return p
+        p = (_SERVERS_ROOT_RESOLVED / server_name).resolve()
     except Exception:
-        pass
-    return None
+        return None
+    if not str(p).startswith(_SERVERS_ROOT_PREFIX):
+        return None
+    if p.is_dir():
+        while len(_SERVER_DIR_CACHE) >= _SERVER_DIR_CACHE_MAX:
+            _SERVER_DIR_CACHE.pop(next(iter(_SERVER_DIR_CACHE)), None)
+        _SERVER_DIR_CACHE[server_name] = p
+    return p
+
+
+def container_id_for(server_name: str) -> str:
+    """Dependency resolving the route's server_name to its container id (404/400 if unavailable)."""
+    return _resolve_container_id(get_docker_manager(), server_name)
+
+
+def _server_dir(server_name: str):
+    return _resolve_server_dir(server_name)
 
-def _parse_log_timestamp(line: str, fallback_date: _dt.date | None) -> int | None:
+_DATE_TS_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})[ T](\d{2}):(\d{2}):(\d{2})")
+_CLOCK_TS_RE = re.compile(r"\[(\d{2}):(\d{2}):(\d{2})\]")
+
+
+def _parse_log_timestamp(line: str, midnight_epoch: int | None, day_cache: dict | None = None) -> int | None:
     """Extract a timestamp (epoch seconds) from a log line if possible.
-    Supports patterns like '2025-11-10 12:34:56' or '[12:34:56]'.
+    Supports patterns like '2025-11-10 12:34:56' or '[12:34:56]'; the latter is
+    offset from midnight_epoch (the UTC midnight of the log file's date).
+    day_cache maps already-seen date strings to their midnight epoch.
     """
     try:
-        m = re.search(r"(\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2}:\d{2})", line)
+        # A full date anywhere on the line wins over a bare [HH:MM:SS] prefix
+        m = _DATE_TS_RE.search(line)
         if m:
-            ts = f"{m.group(1)} {m.group(2)}"
-            dt = _dt.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
-            return int(dt.replace(tzinfo=_dt.timezone.utc).timestamp())
-        m2 = re.search(r"\[(\d{2}:\d{2}:\d{2})\]", line)
-        if m2 and fallback_date:
-            ts = f"{fallback_date.isoformat()} {m2.group(1)}"
-            dt = _dt.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
-            return int(dt.replace(tzinfo=_dt.timezone.utc).timestamp())
+            y, mo, d, h, mi, sec = m.groups()
+            key = (y, mo, d)
+            base = day_cache.get(key) if day_cache is not None else None
+            if base is None:
+                base = calendar.timegm((int(y), int(mo), int(d), 0, 0, 0, 0, 0, 0))
+                if day_cache is not None:
+                    day_cache[key] = base
+        else:
+            if midnight_epoch is None:
+                return None
+            m = _CLOCK_TS_RE.search(line)
+            if not m:
+                return None
+            h, mi, sec = m.groups()
+            base = midnight_epoch
+        return base + int(h) * 3600 + int(mi) * 60 + int(sec)
     except Exception:
         return None
-    return None
+
+
+_REVERSE_READ_CHUNK = 8 * 1024 * 1024
+_GZ_BUFFER_SIZE = 128 * 1024
+
+
+def _open_gz(path):
+    """Open a rotated .gz log for binary reading, using ISA-L when it is installed.
+    Lines are pulled through a 128 KiB buffer rather than the 8 KiB default.
+    """
+    return io.BufferedReader(_gzip.open(path, "rb"), buffer_size=_GZ_BUFFER_SIZE)
+
+
+def _reverse_read_lines(path, max_lines: int):
+    """Yield up to max_lines raw (bytes) lines of a log file, newest first.
+    Plain logs are read backwards in fixed-size chunks so only the tail is touched;
+    gzip rotations cannot seek, so they are streamed into a bounded deque instead.
+    """
+    if max_lines <= 0:
+        return
+    if os.fspath(path).endswith(".gz"):
+        with _open_gz(path) as f:
+            tail = deque(f, maxlen=max_lines)
+        yield from reversed(tail)
+        return
+
+    emitted = 0
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        remainder = b""
+        first = True
+        while pos > 0:
+            size = min(_REVERSE_READ_CHUNK, pos)
+            pos -= size
+            f.seek(pos)
+            parts = (f.read(size) + remainder).split(b"\n")
+            if first:
+                if parts and parts[-1] == b"":
+                    parts.pop()
+                first = False
+            remainder = parts.pop(0) if parts else b""
+            for raw in reversed(parts):
+                yield raw
+                emitted += 1
+                if emitted >= max_lines:
+                    return
+        if remainder:
+            yield remainder
+
+
+_EVT_RE = re.compile(rb"([A-Za-z0-9_\-]{2,16}) (?:joined the game|logged in|left the game|logged out)", re.IGNORECASE)
+
+_ONLINE_RE1 = re.compile(r"There are\s+(\d+)\s+of a max of\s+(\d+)\s+players online")
+_ONLINE_RE2 = re.compile(r"(\d+)\s*/\s*(\d+)\s*players?\s+online")
+
+_HIST_CACHE_TTL = 5.0
+_HIST_CACHE_MAX = 64
+_HIST_CACHE: dict[tuple, tuple[float, tuple, dict]] = {}
+_HIST_CACHE_LOCK = threading.Lock()
+
+
+def _history_fingerprint(base) -> tuple:
+    """Cheap stat-only fingerprint of the files that feed the player history."""
+    fp = []
+    for p in (base / "usercache.json", base / "logs" / "latest.log"):
+        try:
+            st = p.stat()
+            fp.append((st.st_mtime, st.st_size))
+        except OSError:
+            fp.append(None)
+    return tuple(fp)
+
 
 def _collect_history(server_name: str, limit_files: int = 6, limit_lines: int = 8000) -> dict[str, dict]:
     """Scan recent logs and usercache.json to build {name: {last_seen, sources}}.
-    Returns a map keyed by lowercase name.
+    Returns a map keyed by lowercase name. Results are reused for a few seconds
+    while usercache.json and latest.log are unchanged.
     """
     base = _server_dir(server_name)
+    if not base or not base.is_dir():
+        return {}
+
+    key = (server_name, limit_files, limit_lines)
+    fingerprint = _history_fingerprint(base)
+    now = time.monotonic()
+    with _HIST_CACHE_LOCK:
+        cached = _HIST_CACHE.get(key)
+    if cached and now < cached[0] and cached[1] == fingerprint:
+        return cached[2]
+
+    hist = _scan_history(base, limit_files, limit_lines)
+    with _HIST_CACHE_LOCK:
+        _HIST_CACHE.pop(key, None)
+        while len(_HIST_CACHE) >= _HIST_CACHE_MAX:
+            _HIST_CACHE.pop(next(iter(_HIST_CACHE)))
+        _HIST_CACHE[key] = (now + _HIST_CACHE_TTL, fingerprint, hist)
+    return hist
+
+
+def _scan_history(base, limit_files: int, limit_lines: int) -> dict[str, dict]:
     hist: dict[str, dict] = {}
-    if not base:
-        return hist
     
     try:
         uc = base / "usercache.json"
         if uc.exists():
-            data = json.loads(uc.read_text(encoding="utf-8", errors="ignore") or "[]")
+            data = orjson.loads(uc.read_bytes() or b"[]")
             for ent in data or []:
                 name = (ent.get("name") or "").strip()
                 if not name:
                     continue
-                k = name.lower()
-                rec = hist.setdefault(k, {"name": name, "last_seen": None, "sources": set()})
+                k = sys.intern(name.lower())
+                rec = hist.setdefault(k, {"name": sys.intern(name), "last_seen": None, "sources": set()})
                 rec["sources"].add("usercache")
     except Exception:
         pass
     
     try:
-        candidates = []
-        latest = base / "logs" / "latest.log"
-        if latest.exists():
-            candidates.append(latest)
         logs_dir = base / "logs"
-        if logs_dir.exists() and logs_dir.is_dir():
-            for p in logs_dir.iterdir():
-                if p.name == "latest.log":
-                    continue
-                if p.suffix in (".log", ".gz"):
-                    candidates.append(p)
-        
-        candidates.sort(key=lambda p: p.stat().st_mtime if p.exists() else 0, reverse=True)
+        entries: list[tuple[float, str]] = []
+        latest = None
+        if logs_dir.is_dir():
+            with os.scandir(logs_dir) as it:
+                for e in it:
+                    if not e.name.endswith((".log", ".gz")):
+                        continue
+                    try:
+                        mtime = e.stat().st_mtime
+                    except OSError:
+                        continue
+                    if e.name == "latest.log":
+                        latest = (mtime, e.path)
+                    else:
+                        entries.append((mtime, e.path))
+        entries.sort(reverse=True)
+        candidates = ([latest] if latest else []) + entries
         candidates = candidates[:limit_files]
         total_lines = 0
-        joined_re = re.compile(r"([A-Za-z0-9_\-]{2,16}) (joined the game|logged in)", re.IGNORECASE)
-        left_re = re.compile(r"([A-Za-z0-9_\-]{2,16}) (left the game|logged out)", re.IGNORECASE)
-        for p in candidates:
+        day_cache: dict = {}
+        for mtime, p in candidates:
             try:
-                fallback_date = _dt.date.fromtimestamp(p.stat().st_mtime)
+                file_date = _dt.date.fromtimestamp(mtime)
+                file_midnight = calendar.timegm(file_date.timetuple())
             except Exception:
-                fallback_date = None
+                file_midnight = None
             
-            lines: list[str] = []
             try:
-                if p.suffix == ".gz":
-                    with gzip.open(p, "rt", encoding="utf-8", errors="ignore") as f:
-                        lines = f.readlines()
-                else:
-                    with open(p, "r", encoding="utf-8", errors="ignore") as f:
-                        lines = f.readlines()
+                for line in _reverse_read_lines(p, limit_lines - total_lines):
+                    total_lines += 1
+                    m = _EVT_RE.search(line)
+                    if not m:
+                        continue
+                    name = m.group(1).decode("ascii")
+                    k = sys.intern(name.lower())
+                    ts = _parse_log_timestamp(line.decode("utf-8", errors="ignore"), file_midnight, day_cache)
+                    rec = hist.setdefault(k, {"name": sys.intern(name), "last_seen": None, "sources": set()})
+                    if ts and (rec["last_seen"] is None or int(ts) > int(rec["last_seen"])):
+                        rec["last_seen"] = int(ts)
+                    rec["sources"].add("logs")
             except Exception:
                 continue
-            
-            for line in reversed(lines):
-                if total_lines >= limit_lines:
-                    break
-                total_lines += 1
-                m = joined_re.search(line) or left_re.search(line)
-                if not m:
-                    continue
-                name = m.group(1)
-                k = name.lower()
-                ts = _parse_log_timestamp(line, fallback_date)
-                rec = hist.setdefault(k, {"name": name, "last_seen": None, "sources": set()})
-                if ts and (rec["last_seen"] is None or int(ts) > int(rec["last_seen"])):
-                    rec["last_seen"] = int(ts)
-                rec["sources"].add("logs")
+            if total_lines >= limit_lines:
+                break
     except Exception:
         pass
     
@@ -150,11 +322,31 @@ def _collect_history(server_name: str, limit_files: int = 6, limit_lines: int =
             v["sources"] = sorted(list(v["sources"]))
     return hist
 
+def _deactivate_action(db: Session, server_name: str, player_name: str, action_type: str) -> None:
+    """Mark a player's active action of the given type inactive in a single UPDATE."""
+    try:
+        db.query(PlayerAction).filter(
+            PlayerAction.server_name == server_name,
+            PlayerAction.player_name == player_name,
+            PlayerAction.action_type == action_type,
+            PlayerAction.is_active == True
+        ).update({"is_active": False}, synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+
+
 @router.get("/{server_name}/roster")
-async def get_player_roster(server_name: str, current_user: User = Depends(require_auth)):
+async def get_player_roster(
+    server_name: str,
+    include_offline: bool = Query(True, description="Scan logs/usercache for offline players"),
+    limit: int = Query(100, ge=1, le=5000, description="Maximum number of offline players returned"),
+    sort_key: str = Query("recency", pattern="^(recency|name)$", description="Offline ordering: recency or name"),
+    current_user: User = Depends(require_auth),
+):
     """Return online and offline players with last_seen.
     online: list of names (authoritative if available)
-    offline: list of {name, last_seen} sorted by recency
+    offline: list of {name, last_seen} sorted by recency (or name), capped at limit
     """
     
     online_names: list[str] = []
@@ -163,13 +355,7 @@ async def get_player_roster(server_name: str, current_user: User = Depends(requi
     method = None
     try:
         dm = get_docker_manager()
-        servers = dm.list_servers()
-        target = next((s for s in servers if s.get("name") == server_name), None)
-        if not target:
-            raise HTTPException(status_code=404, detail="Server not found")
-        cid = target.get("id")
-        if not cid:
-            raise HTTPException(status_code=400, detail="Server container not found")
+        cid = _resolve_container_id(dm, server_name)
         info = dm.get_player_info(cid)
         online_names = [n for n in (info.get("names") or []) if isinstance(n, str)]
         online_count = info.get("online") or len(online_names)
@@ -184,15 +370,16 @@ async def get_player_roster(server_name: str, current_user: User = Depends(requi
         method = "error"
 
     
-    hist = _collect_history(server_name)
-    online_set = {n.lower() for n in online_names}
     offline: list[dict] = []
-    for k, rec in hist.items():
-        if k in online_set:
-            continue
-        offline.append({"name": rec.get("name"), "last_seen": rec.get("last_seen")})
-    
-    offline.sort(key=lambda x: (x.get("last_seen") or 0), reverse=True)
+    if include_offline:
+        hist = _collect_history(server_name)
+        online_set = {n.lower() for n in online_names}
+        rows = ({"name": rec.get("name"), "last_seen": rec.get("last_seen")}
+                for k, rec in hist.items() if k not in online_set)
+        if sort_key == "name":
+            offline = heapq.nsmallest(limit, rows, key=lambda x: (x.get("name") or "").lower())
+        else:
+            offline = heapq.nlargest(limit, rows, key=lambda x: (x.get("last_seen") or 0))
     return {
         "online": online_names,
         "offline": offline,
@@ -219,6 +406,7 @@ async def whitelist_player(
     server_name: str,
     action_data: PlayerActionCreate,
     current_user: User = Depends(require_moderator),
+    container_id: str = Depends(container_id_for),
     db: Session = Depends(get_db)
 ):
     """Add a player to the whitelist."""
@@ -228,26 +416,6 @@ async def whitelist_player(
     try:
         
         docker_manager = get_docker_manager()
-        servers = docker_manager.list_servers()
-        
-        target_server = None
-        for server in servers:
-            if server.get("name") == server_name:
-                target_server = server
-                break
-        
-        if not target_server:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Server not found"
-            )
-        
-        container_id = target_server.get("id")
-        if not container_id:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Server container not found"
-            )
         
         
         command = f"whitelist add {action_data.player_name}"
@@ -264,10 +432,11 @@ async def whitelist_player(
         )
         
         db.add(player_action)
+        db.flush()
+        response = PlayerActionResponse.model_validate(player_action)
         db.commit()
-        db.refresh(player_action)
         
-        return player_action
+        return response
         
     except Exception as e:
         raise HTTPException(
@@ -280,52 +449,20 @@ async def remove_from_whitelist(
     server_name: str,
     player_name: str,
     current_user: User = Depends(require_moderator),
+    container_id: str = Depends(container_id_for),
     db: Session = Depends(get_db)
 ):
     """Remove a player from the whitelist."""
     try:
         
         docker_manager = get_docker_manager()
-        servers = docker_manager.list_servers()
-        
-        target_server = None
-        for server in servers:
-            if server.get("name") == server_name:
-                target_server = server
-                break
-        
-        if not target_server:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Server not found"
-            )
-        
-        container_id = target_server.get("id")
-        if not container_id:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Server container not found"
-            )
         
         
         command = f"whitelist remove {player_name}"
         docker_manager.send_command(container_id, command)
         
         
-        player_action = db.query(PlayerAction).filter(
-            PlayerAction.server_name == server_name,
-            PlayerAction.player_name == player_name,
-            PlayerAction.action_type == "whitelist",
-            PlayerAction.is_active == True
-        ).first()
-        
-        if player_action:
-            try:
-                
-                setattr(player_action, 'is_active', False)
-                db.commit()
-            except Exception:
-                pass
+        _deactivate_action(db, server_name, player_name, "whitelist")
         
         return {"message": f"Player {player_name} removed from whitelist"}
         
@@ -340,6 +477,7 @@ async def ban_player(
     server_name: str,
     action_data: PlayerActionCreate,
     current_user: User = Depends(require_moderator),
+    container_id: str = Depends(container_id_for),
     db: Session = Depends(get_db)
 ):
     """Ban a player from the server."""
@@ -349,26 +487,6 @@ async def ban_player(
     try:
         
         docker_manager = get_docker_manager()
-        servers = docker_manager.list_servers()
-        
-        target_server = None
-        for server in servers:
-            if server.get("name") == server_name:
-                target_server = server
-                break
-        
-        if not target_server:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Server not found"
-            )
-        
-        container_id = target_server.get("id")
-        if not container_id:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Server container not found"
-            )
         
         
         if action_data.reason:
@@ -388,10 +506,11 @@ async def ban_player(
         )
         
         db.add(player_action)
+        db.flush()
+        response = PlayerActionResponse.model_validate(player_action)
         db.commit()
-        db.refresh(player_action)
         
-        return player_action
+        return response
         
     except Exception as e:
         raise HTTPException(
@@ -404,51 +523,20 @@ async def unban_player(
     server_name: str,
     player_name: str,
     current_user: User = Depends(require_moderator),
+    container_id: str = Depends(container_id_for),
     db: Session = Depends(get_db)
 ):
     """Unban a player from the server."""
     try:
         
         docker_manager = get_docker_manager()
-        servers = docker_manager.list_servers()
-        
-        target_server = None
-        for server in servers:
-            if server.get("name") == server_name:
-                target_server = server
-                break
-        
-        if not target_server:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Server not found"
-            )
-        
-        container_id = target_server.get("id")
-        if not container_id:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Server container not found"
-            )
         
         
         command = f"pardon {player_name}"
         docker_manager.send_command(container_id, command)
         
         
-        player_action = db.query(PlayerAction).filter(
-            PlayerAction.server_name == server_name,
-            PlayerAction.player_name == player_name,
-            PlayerAction.action_type == "ban",
-            PlayerAction.is_active == True
-        ).first()
-        
-        if player_action:
-            try:
-                setattr(player_action, 'is_active', False)
-                db.commit()
-            except Exception:
-                pass
+        _deactivate_action(db, server_name, player_name, "ban")
         
         return {"message": f"Player {player_name} unbanned"}
         
@@ -463,6 +551,7 @@ async def kick_player(
     server_name: str,
     action_data: PlayerActionCreate,
     current_user: User = Depends(require_moderator),
+    container_id: str = Depends(container_id_for),
     db: Session = Depends(get_db)
 ):
     """Kick a player from the server."""
@@ -472,26 +561,6 @@ async def kick_player(
     try:
         
         docker_manager = get_docker_manager()
-        servers = docker_manager.list_servers()
-        
-        target_server = None
-        for server in servers:
-            if server.get("name") == server_name:
-                target_server = server
-                break
-        
-        if not target_server:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Server not found"
-            )
-        
-        container_id = target_server.get("id")
-        if not container_id:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Server container not found"
-            )
         
         
         if action_data.reason:
@@ -512,7 +581,6 @@ async def kick_player(
         
         db.add(player_action)
         db.commit()
-        db.refresh(player_action)
         
         return {"message": f"Player {action_data.player_name} kicked"}
         
@@ -527,6 +595,7 @@ async def op_player(
     server_name: str,
     action_data: PlayerActionCreate,
     current_user: User = Depends(require_moderator),
+    container_id: str = Depends(container_id_for),
     db: Session = Depends(get_db)
 ):
     """Give operator privileges to a player."""
@@ -536,26 +605,6 @@ async def op_player(
     try:
         
         docker_manager = get_docker_manager()
-        servers = docker_manager.list_servers()
-        
-        target_server = None
-        for server in servers:
-            if server.get("name") == server_name:
-                target_server = server
-                break
-        
-        if not target_server:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Server not found"
-            )
-        
-        container_id = target_server.get("id")
-        if not container_id:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Server container not found"
-            )
         
         
         command = f"op {action_data.player_name}"
@@ -572,10 +621,11 @@ async def op_player(
         )
         
         db.add(player_action)
+        db.flush()
+        response = PlayerActionResponse.model_validate(player_action)
         db.commit()
-        db.refresh(player_action)
         
-        return player_action
+        return response
         
     except Exception as e:
         raise HTTPException(
@@ -588,51 +638,20 @@ async def deop_player(
     server_name: str,
     player_name: str,
     current_user: User = Depends(require_moderator),
+    container_id: str = Depends(container_id_for),
     db: Session = Depends(get_db)
 ):
     """Remove operator privileges from a player."""
     try:
         
         docker_manager = get_docker_manager()
-        servers = docker_manager.list_servers()
-        
-        target_server = None
-        for server in servers:
-            if server.get("name") == server_name:
-                target_server = server
-                break
-        
-        if not target_server:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Server not found"
-            )
-        
-        container_id = target_server.get("id")
-        if not container_id:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Server container not found"
-            )
         
         
         command = f"deop {player_name}"
         docker_manager.send_command(container_id, command)
         
         
-        player_action = db.query(PlayerAction).filter(
-            PlayerAction.server_name == server_name,
-            PlayerAction.player_name == player_name,
-            PlayerAction.action_type == "op",
-            PlayerAction.is_active == True
-        ).first()
-        
-        if player_action:
-            try:
-                setattr(player_action, 'is_active', False)
-                db.commit()
-            except Exception:
-                pass
+        _deactivate_action(db, server_name, player_name, "op")
         
         return {"message": f"Player {player_name} de-opped"}
         
@@ -645,32 +664,13 @@ async def deop_player(
 @router.get("/{server_name}/online")
 async def get_online_players(
     server_name: str,
-    current_user: User = Depends(require_auth)
+    current_user: User = Depends(require_auth),
+    container_id: str = Depends(container_id_for),
 ):
     """Get list of currently online players."""
     try:
         
         docker_manager = get_docker_manager()
-        servers = docker_manager.list_servers()
-        
-        target_server = None
-        for server in servers:
-            if server.get("name") == server_name:
-                target_server = server
-                break
-        
-        if not target_server:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Server not found"
-            )
-        
-        container_id = target_server.get("id")
-        if not container_id:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Server container not found"
-            )
         
         
         
@@ -687,10 +687,7 @@ async def get_online_players(
             
             try:
                 text = result if isinstance(result, str) else (result.get('output') if isinstance(result, dict) else '')
-                import re as _re
-                m = _re.search(r"There are\s+(\d+)\s+of a max of\s+(\d+)\s+players online", str(text))
-                if not m:
-                    m = _re.search(r"(\d+)\s*/\s*(\d+)\s*players? online", str(text))
+                m = _ONLINE_RE1.search(str(text)) or _ONLINE_RE2.search(str(text))
                 names = []
                 online = int(m.group(1)) if m else 0
                 maxp = int(m.group(2)) if m else 0
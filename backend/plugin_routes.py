@@ -3,21 +3,29 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from pathlib import Path
 from pydantic import BaseModel
+import asyncio
+import functools
+import os
+import time
 
 from database import get_db
 from auth import require_auth, require_moderator
 from models import User
-from file_manager import upload_file as fm_upload_file, delete_path as fm_delete_path
+from file_manager import get_upload_dest, delete_path as fm_delete_path, invalidate_cache
 from runtime_adapter import get_runtime_manager_or_docker
-from config import SERVERS_ROOT
+from player_routes import container_id_for, _resolve_server_dir, _SERVER_NAME_RE
 import mod_sources
 
 router = APIRouter(prefix="/plugins", tags=["plugins"])
 
+_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
 
 def _server_dir(server_name: str) -> Path:
-    server_dir = (SERVERS_ROOT / server_name).resolve()
-    if not server_dir.exists():
+    if not _SERVER_NAME_RE.match(server_name):
+        raise HTTPException(status_code=400, detail="Invalid server name")
+    server_dir = _resolve_server_dir(server_name)
+    if server_dir is None or not server_dir.exists():
         raise HTTPException(status_code=404, detail="Server not found")
     return server_dir
 
@@ -46,13 +54,13 @@ async def list_plugins(
 ):
     """List plugin JARs in the server's plugins directory."""
     pdir = _plugins_dir(server_name)
-    items: List[dict] = []
-    for p in sorted(pdir.glob("*.jar")):
-        items.append({
-            "name": p.name,
-            "size": p.stat().st_size,
-            "modified": int(p.stat().st_mtime),
-        })
+    with os.scandir(pdir) as it:
+        entries = [(e.name, e.stat()) for e in it
+                   if e.name.endswith(".jar") and not e.name.startswith(".") and e.is_file()]
+    items: List[dict] = [
+        {"name": name, "size": st.st_size, "modified": int(st.st_mtime)}
+        for name, st in sorted(entries)
+    ]
     return {"plugins": items}
 
 
@@ -68,7 +76,29 @@ async def upload_plugin(
     if not (file.filename and file.filename.lower().endswith(".jar")):
         raise HTTPException(status_code=400, detail="Only .jar files are allowed")
     
-    fm_upload_file(server_name, "plugins", file)
+    dest = get_upload_dest(server_name, "plugins", file.filename)
+    part = dest.with_name(dest.name + ".part")
+    loop = asyncio.get_running_loop()
+    try:
+        with open(part, "wb", buffering=_UPLOAD_CHUNK_SIZE) as f:
+            while True:
+                chunk = await file.read(_UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await loop.run_in_executor(None, f.write, chunk)
+        os.replace(part, dest)
+    except Exception:
+        try:
+            part.unlink()
+        except OSError:
+            pass
+        raise
+    finally:
+        try:
+            await file.close()
+        except Exception:
+            pass
+    invalidate_cache(server_name)
     return {"ok": True}
 
 
@@ -91,17 +121,10 @@ async def delete_plugin(
 async def reload_plugins(
     server_name: str,
     current_user: User = Depends(require_moderator),
+    container_id: str = Depends(container_id_for),
 ):
     """Reload plugins by issuing a server reload command."""
     dm = _get_docker_manager()
-    servers = dm.list_servers()
-    container_id = None
-    for s in servers:
-        if s.get("name") == server_name:
-            container_id = s.get("id")
-            break
-    if not container_id:
-        raise HTTPException(status_code=404, detail="Server container not found")
     
     resp = dm.send_command(container_id, "reload confirm")
     if resp.get("exit_code", 1) != 0:
@@ -111,6 +134,21 @@ async def reload_plugins(
 
 # ===== New endpoints for plugin search and install =====
 
+_SEARCH_TTL = 30.0
+_SEARCH_CACHE_MAX = 1024
+_search_cache: dict[tuple, tuple[float, dict]] = {}
+_search_pending: dict[tuple, asyncio.Future] = {}
+
+
+def _search_done(key: tuple, task: asyncio.Future) -> None:
+    _search_pending.pop(key, None)
+    if task.cancelled() or task.exception() is not None:
+        return
+    _search_cache.pop(key, None)
+    while len(_search_cache) >= _SEARCH_CACHE_MAX:
+        _search_cache.pop(next(iter(_search_cache)))
+    _search_cache[key] = (time.monotonic() + _SEARCH_TTL, task.result())
+
 @router.get("/{server_name}/sources")
 async def list_plugin_sources(
     server_name: str,
@@ -141,15 +179,24 @@ async def search_plugins(
         raise HTTPException(status_code=400, detail="Invalid source. Use 'modrinth' or 'spiget'")
     
     try:
-        result = await mod_sources.search_plugins(
-            query=query,
-            source=source,
-            game_version=version,
-            server_type=server_type,
-            limit=limit,
-            offset=offset,
-        )
-        return result
+        key = (source, query, version, server_type, limit, offset)
+        hit = _search_cache.get(key)
+        if hit and time.monotonic() < hit[0]:
+            return hit[1]
+        # Identical searches already in flight share one upstream request
+        task = _search_pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(mod_sources.search_plugins(
+                query=query,
+                source=source,
+                game_version=version,
+                server_type=server_type,
+                limit=limit,
+                offset=offset,
+            ))
+            _search_pending[key] = task
+            task.add_done_callback(functools.partial(_search_done, key))
+        return await asyncio.shield(task)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
@@ -174,7 +221,7 @@ async def install_plugin(
     # For Spiget, get the download URL
     download_url = payload.url
     if payload.source == "spiget" and payload.resource_id:
-        client = mod_sources.SpigetClient()
+        client = mod_sources.get_spiget_client()
         download_url = await client.get_download_url(payload.resource_id)
     
     if not download_url:
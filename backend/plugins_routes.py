@@ -4,19 +4,22 @@ Plugin marketplace, custom server types, extension loader
 """
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, or_, cast, func, update, Float
 from pydantic import BaseModel, validator, HttpUrl
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
-import json
+import orjson
 import importlib
+from concurrent.futures import ThreadPoolExecutor
 import sys
 import os
 from pathlib import Path
 import zipfile
 import tempfile
 import hashlib
+import asyncio
+import shutil
 
 from database import get_db
 from models import User, Plugin, PluginVersion, PluginInstallation, PluginReview
@@ -59,8 +62,23 @@ class PluginReviewCreate(BaseModel):
 
 # ==================== Plugin Marketplace ====================
 
+def _owner_inst(plugin_id: int, user_id: int):
+    return and_(PluginInstallation.plugin_id == plugin_id, PluginInstallation.user_id == user_id)
+
+
+def _owner_review(plugin_id: int, user_id: int):
+    return and_(PluginReview.plugin_id == plugin_id, PluginReview.user_id == user_id)
+
+
+# Fixed ORDER BY clauses keep the marketplace statement shapes stable for the compiled-query cache
+_MARKETPLACE_SORTS = {
+    "downloads": Plugin.download_count.desc(),
+    "rating": Plugin.average_rating.desc(),
+    "recent": Plugin.created_at.desc(),
+}
+
 @router.get("/marketplace")
-async def list_marketplace_plugins(
+def list_marketplace_plugins(
     category: Optional[str] = None,
     search: Optional[str] = None,
     sort_by: str = "downloads",  # downloads, rating, recent
@@ -85,14 +103,11 @@ async def list_marketplace_plugins(
         )
     
     # Sorting
-    if sort_by == "downloads":
-        query = query.order_by(Plugin.download_count.desc())
-    elif sort_by == "rating":
-        query = query.order_by(Plugin.average_rating.desc())
-    elif sort_by == "recent":
-        query = query.order_by(Plugin.created_at.desc())
+    order = _MARKETPLACE_SORTS.get(sort_by)
+    if order is not None:
+        query = query.order_by(order)
     
-    plugins = query.limit(limit).all()
+    plugins = query.limit(limit).yield_per(100)
     
     return {
         'plugins': [
@@ -108,7 +123,7 @@ async def list_marketplace_plugins(
                 'rating': p.average_rating,
                 'review_count': p.review_count,
                 'repository_url': p.repository_url,
-                'created_at': p.created_at.isoformat()
+                'created_at': p.created_at
             }
             for p in plugins
         ]
@@ -116,7 +131,7 @@ async def list_marketplace_plugins(
 
 
 @router.get("/marketplace/{plugin_id}")
-async def get_plugin_details(
+def get_plugin_details(
     plugin_id: int,
     current_user: User = Depends(require_auth),
     db: Session = Depends(get_db)
@@ -133,17 +148,14 @@ async def get_plugin_details(
     ).order_by(PluginVersion.created_at.desc()).all()
     
     # Get reviews
-    reviews = db.query(PluginReview).filter(
+    reviews = db.query(PluginReview).options(joinedload(PluginReview.user)).filter(
         PluginReview.plugin_id == plugin_id
     ).order_by(PluginReview.created_at.desc()).limit(10).all()
     
-    # Check if installed
-    installation = db.query(PluginInstallation).filter(
-        and_(
-            PluginInstallation.plugin_id == plugin_id,
-            PluginInstallation.user_id == current_user.id
-        )
-    ).first()
+    # Check if installed (only the version column is needed)
+    installed_version = db.query(PluginInstallation.version).filter(
+        _owner_inst(plugin_id, current_user.id)
+    ).scalar()
     
     return {
         'id': plugin.id,
@@ -158,14 +170,14 @@ async def get_plugin_details(
         'downloads': plugin.download_count,
         'average_rating': plugin.average_rating,
         'review_count': plugin.review_count,
-        'is_installed': installation is not None,
-        'installed_version': installation.version if installation else None,
+        'is_installed': installed_version is not None,
+        'installed_version': installed_version,
         'versions': [
             {
                 'version': v.version,
                 'changelog': v.changelog,
                 'downloads': v.download_count,
-                'created_at': v.created_at.isoformat()
+                'created_at': v.created_at
             }
             for v in versions
         ],
@@ -174,7 +186,7 @@ async def get_plugin_details(
                 'user': r.user.username,
                 'rating': r.rating,
                 'comment': r.comment,
-                'created_at': r.created_at.isoformat()
+                'created_at': r.created_at
             }
             for r in reviews
         ]
@@ -182,7 +194,7 @@ async def get_plugin_details(
 
 
 @router.post("/marketplace")
-async def publish_plugin(
+def publish_plugin(
     plugin: PluginCreate,
     current_user: User = Depends(require_auth),
     db: Session = Depends(get_db)
@@ -190,8 +202,8 @@ async def publish_plugin(
     """Publish a new plugin to marketplace"""
     
     # Check if plugin name already exists
-    existing = db.query(Plugin).filter(Plugin.name == plugin.name).first()
-    if existing:
+    name_taken = db.query(db.query(Plugin).filter(Plugin.name == plugin.name).exists()).scalar()
+    if name_taken:
         raise HTTPException(status_code=400, detail="Plugin name already exists")
     
     new_plugin = Plugin(
@@ -207,7 +219,8 @@ async def publish_plugin(
         latest_version="0.0.0",
         download_count=0,
         average_rating=0.0,
-        review_count=0
+        review_count=0,
+        rating_sum=0
     )
     db.add(new_plugin)
     db.commit()
@@ -220,6 +233,27 @@ async def publish_plugin(
     }
 
 
+class _HashingWriter:
+    """File-like wrapper that checksums and counts bytes as they are written"""
+    
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+    
+    def write(self, data) -> int:
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.f.write(data)
+
+
+def _copy_hashed(src, dest_path: Path) -> _HashingWriter:
+    with open(dest_path, "wb") as f:
+        writer = _HashingWriter(f)
+        shutil.copyfileobj(src, writer, 1024 * 1024)
+    return writer
+
+
 @router.post("/marketplace/{plugin_id}/versions")
 async def upload_plugin_version(
     plugin_id: int,
@@ -245,19 +279,17 @@ async def upload_plugin_version(
     
     file_path = plugins_dir / f"{version}.zip"
     
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
-    
-    # Calculate checksum
-    checksum = hashlib.sha256(content).hexdigest()
+    # Write and checksum in one streamed pass, off the event loop
+    written = await asyncio.to_thread(_copy_hashed, file.file, file_path)
+    checksum = written.sha256.hexdigest()
+    file_size = written.size
     
     # Create version record
     plugin_version = PluginVersion(
         plugin_id=plugin_id,
         version=version,
         file_path=str(file_path),
-        file_size=len(content),
+        file_size=file_size,
         checksum=checksum,
         changelog=changelog,
         download_count=0
@@ -278,7 +310,7 @@ async def upload_plugin_version(
 # ==================== Plugin Installation ====================
 
 @router.post("/{plugin_id}/install")
-async def install_plugin(
+def install_plugin(
     plugin_id: int,
     version: Optional[str] = None,
     current_user: User = Depends(require_auth),
@@ -307,10 +339,7 @@ async def install_plugin(
     
     # Check if already installed
     existing = db.query(PluginInstallation).filter(
-        and_(
-            PluginInstallation.plugin_id == plugin_id,
-            PluginInstallation.user_id == current_user.id
-        )
+        _owner_inst(plugin_id, current_user.id)
     ).first()
     
     if existing:
@@ -342,37 +371,33 @@ async def install_plugin(
 
 
 @router.delete("/{plugin_id}/uninstall")
-async def uninstall_plugin(
+def uninstall_plugin(
     plugin_id: int,
     current_user: User = Depends(require_auth),
     db: Session = Depends(get_db)
 ):
     """Uninstall a plugin"""
     
-    installation = db.query(PluginInstallation).filter(
-        and_(
-            PluginInstallation.plugin_id == plugin_id,
-            PluginInstallation.user_id == current_user.id
-        )
-    ).first()
+    deleted = db.query(PluginInstallation).filter(
+        _owner_inst(plugin_id, current_user.id)
+    ).delete(synchronize_session=False)
     
-    if not installation:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Plugin not installed")
     
-    db.delete(installation)
     db.commit()
     
     return {'success': True, 'message': 'Plugin uninstalled'}
 
 
 @router.get("/installed")
-async def list_installed_plugins(
+def list_installed_plugins(
     current_user: User = Depends(require_auth),
     db: Session = Depends(get_db)
 ):
     """List user's installed plugins"""
     
-    installations = db.query(PluginInstallation).filter(
+    installations = db.query(PluginInstallation).options(joinedload(PluginInstallation.plugin)).filter(
         PluginInstallation.user_id == current_user.id
     ).all()
     
@@ -386,7 +411,7 @@ async def list_installed_plugins(
                 'version': inst.version,
                 'latest_version': inst.plugin.latest_version,
                 'is_enabled': inst.is_enabled,
-                'installed_at': inst.installed_at.isoformat(),
+                'installed_at': inst.installed_at,
                 'needs_update': inst.version != inst.plugin.latest_version
             }
             for inst in installations
@@ -395,7 +420,7 @@ async def list_installed_plugins(
 
 
 @router.put("/{plugin_id}/toggle")
-async def toggle_plugin(
+def toggle_plugin(
     plugin_id: int,
     enabled: bool,
     current_user: User = Depends(require_auth),
@@ -404,10 +429,7 @@ async def toggle_plugin(
     """Enable or disable an installed plugin"""
     
     installation = db.query(PluginInstallation).filter(
-        and_(
-            PluginInstallation.plugin_id == plugin_id,
-            PluginInstallation.user_id == current_user.id
-        )
+        _owner_inst(plugin_id, current_user.id)
     ).first()
     
     if not installation:
@@ -426,7 +448,7 @@ async def toggle_plugin(
 # ==================== Plugin Reviews ====================
 
 @router.post("/{plugin_id}/reviews")
-async def create_review(
+def create_review(
     plugin_id: int,
     review: PluginReviewCreate,
     current_user: User = Depends(require_auth),
@@ -435,20 +457,19 @@ async def create_review(
     """Create a plugin review"""
     
     # Check if plugin exists
-    plugin = db.query(Plugin).filter(Plugin.id == plugin_id).first()
-    if not plugin:
+    plugin_exists = db.query(db.query(Plugin).filter(Plugin.id == plugin_id).exists()).scalar()
+    if not plugin_exists:
         raise HTTPException(status_code=404, detail="Plugin not found")
     
     # Check if already reviewed
     existing = db.query(PluginReview).filter(
-        and_(
-            PluginReview.plugin_id == plugin_id,
-            PluginReview.user_id == current_user.id
-        )
+        _owner_review(plugin_id, current_user.id)
     ).first()
     
     if existing:
         # Update existing review
+        rating_delta = review.rating - existing.rating
+        count_delta = 0
         existing.rating = review.rating
         existing.comment = review.comment
         existing.updated_at = datetime.utcnow()
@@ -461,22 +482,32 @@ async def create_review(
             comment=review.comment
         )
         db.add(new_review)
-        plugin.review_count += 1
-    
-    # Recalculate average rating
-    from sqlalchemy import func
-    avg_rating = db.query(func.avg(PluginReview.rating)).filter(
-        PluginReview.plugin_id == plugin_id
-    ).scalar()
-    
-    plugin.average_rating = round(float(avg_rating), 2) if avg_rating else 0.0
+        rating_delta = review.rating
+        count_delta = 1
+    
+    # Apply the deltas in SQL so concurrent reviews can't overwrite each other;
+    # SET expressions all see the pre-update row, so the average matches the new totals
+    new_sum = func.coalesce(Plugin.rating_sum, 0) + rating_delta
+    new_count = func.coalesce(Plugin.review_count, 0) + count_delta
+    db.execute(
+        update(Plugin)
+        .where(Plugin.id == plugin_id)
+        .values(
+            rating_sum=new_sum,
+            review_count=new_count,
+            average_rating=func.coalesce(
+                func.round(cast(new_sum, Float) / func.nullif(new_count, 0), 2), 0.0
+            )
+        )
+        .execution_options(synchronize_session=False)
+    )
     db.commit()
     
     return {'success': True, 'message': 'Review submitted'}
 
 
 @router.get("/{plugin_id}/reviews")
-async def list_reviews(
+def list_reviews(
     plugin_id: int,
     limit: int = 50,
     current_user: User = Depends(require_auth),
@@ -484,7 +515,7 @@ async def list_reviews(
 ):
     """List plugin reviews"""
     
-    reviews = db.query(PluginReview).filter(
+    reviews = db.query(PluginReview).options(joinedload(PluginReview.user)).filter(
         PluginReview.plugin_id == plugin_id
     ).order_by(PluginReview.created_at.desc()).limit(limit).all()
     
@@ -495,7 +526,7 @@ async def list_reviews(
                 'user': r.user.username,
                 'rating': r.rating,
                 'comment': r.comment,
-                'created_at': r.created_at.isoformat()
+                'created_at': r.created_at
             }
             for r in reviews
         ]
@@ -505,14 +536,14 @@ async def list_reviews(
 # ==================== Plugin Loading (Custom Server Types) ====================
 
 @router.get("/server-types")
-async def list_plugin_server_types(
+def list_plugin_server_types(
     current_user: User = Depends(require_auth),
     db: Session = Depends(get_db)
 ):
     """List custom server types from plugins"""
     
     # Get enabled plugin installations
-    installations = db.query(PluginInstallation).filter(
+    installations = db.query(PluginInstallation).options(joinedload(PluginInstallation.plugin)).filter(
         and_(
             PluginInstallation.user_id == current_user.id,
             PluginInstallation.is_enabled == True
@@ -536,48 +567,70 @@ async def list_plugin_server_types(
     return {'server_types': server_types}
 
 
+_meta_cache: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+
+
 def _load_plugin_metadata(plugin_name: str, version: str) -> Optional[Dict[str, Any]]:
-    """Load plugin metadata from installed plugin"""
+    """Load plugin metadata from installed plugin (cached until plugin.json changes)"""
     
     plugin_dir = Path("plugins") / plugin_name / version
     metadata_file = plugin_dir / "plugin.json"
     
-    if not metadata_file.exists():
+    try:
+        mtime_ns = metadata_file.stat().st_mtime_ns
+    except OSError:
         return None
     
-    with open(metadata_file, 'r') as f:
-        return json.load(f)
+    key = str(metadata_file)
+    cached = _meta_cache.get(key)
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
+    
+    data = orjson.loads(metadata_file.read_bytes())
+    _meta_cache[key] = (mtime_ns, data)
+    return data
+
+
+_RELOAD_WORKERS = 8
+
+
+def _reload_one(plugin_name: str) -> None:
+    """Reload (or first-import) a plugin module"""
+    module_name = f"plugins.{plugin_name}"
+    module = sys.modules.get(module_name)
+    if module is not None:
+        importlib.reload(module)
+    else:
+        importlib.import_module(module_name)
 
 
 @router.post("/reload")
-async def reload_plugins(
+def reload_plugins(
     current_user: User = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
     """Reload all enabled plugins (admin only)"""
     
-    installations = db.query(PluginInstallation).filter(
+    installations = db.query(PluginInstallation).options(joinedload(PluginInstallation.plugin)).filter(
         PluginInstallation.is_enabled == True
     ).all()
     
     loaded = []
     errors = []
     
-    for inst in installations:
-        try:
-            # Reload plugin module
-            module_name = f"plugins.{inst.plugin.name}"
-            if module_name in sys.modules:
-                importlib.reload(sys.modules[module_name])
-            else:
-                importlib.import_module(module_name)
-            
-            loaded.append(inst.plugin.name)
-        except Exception as e:
-            errors.append({
-                'plugin': inst.plugin.name,
-                'error': str(e)
-            })
+    # Imports are mostly disk-bound and the import system locks per module, so reload in parallel
+    names = list(dict.fromkeys(inst.plugin.name for inst in installations))
+    with ThreadPoolExecutor(max_workers=_RELOAD_WORKERS) as ex:
+        futures = [(name, ex.submit(_reload_one, name)) for name in names]
+        for name, fut in futures:
+            try:
+                fut.result()
+                loaded.append(name)
+            except Exception as e:
+                errors.append({
+                    'plugin': name,
+                    'error': str(e)
+                })
     
     return {
         'success': len(errors) == 0,
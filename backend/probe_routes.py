@@ -1,75 +1,180 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from typing import Optional
-import requests
+import asyncio
+import contextlib
+import time
+import httpx
 from auth import require_auth
 from models import User
 
 router = APIRouter(prefix="/probe", tags=["probe"])
 
+PAPER_API_BASE = "https://api.papermc.io/v2/projects/paper"
+
+# Maps every byte to itself if printable ASCII, else '.'
+_PRINTABLE = bytes(b if 32 <= b <= 126 else 0x2E for b in range(256))
+
+
+def create_paper_client() -> httpx.AsyncClient:
+    """Keep-alive client for the PaperMC API; created on startup and stored on app.state."""
+    return httpx.AsyncClient(
+        base_url=PAPER_API_BASE,
+        timeout=15,
+        follow_redirects=True,
+        limits=httpx.Limits(max_keepalive_connections=20),
+    )
+
+
+def get_paper_client(request: Request) -> httpx.AsyncClient:
+    client = getattr(request.app.state, "paper_client", None)
+    if client is None:
+        client = request.app.state.paper_client = create_paper_client()
+    return client
+
+
+# Version listings change when new builds land; build metadata never changes once published.
+_VERSIONS_TTL = 300.0
+_VERSIONS_MAX = 512
+_BUILD_TTL = 86400.0
+_BUILD_MAX = 4096
+_versions_cache: dict[str, tuple[float, int]] = {}
+_build_cache: dict[tuple[str, int], tuple[float, str]] = {}
+# key -> [lock, holders + waiters]; entries are dropped once nobody uses them
+_fetch_locks: dict[tuple, list] = {}
+
+
+def _cache_get(cache: dict, key):
+    hit = cache.get(key)
+    if hit and time.monotonic() < hit[0]:
+        return hit[1]
+    return None
+
+
+@contextlib.asynccontextmanager
+async def _single_flight(key: tuple):
+    entry = _fetch_locks.get(key)
+    if entry is None:
+        entry = _fetch_locks[key] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0 and _fetch_locks.get(key) is entry:
+            del _fetch_locks[key]
+
+
+def _cache_put(cache: dict, key, value, ttl: float, maxsize: int) -> None:
+    cache.pop(key, None)
+    while len(cache) >= maxsize:
+        cache.pop(next(iter(cache)))
+    cache[key] = (time.monotonic() + ttl, value)
+
+
+async def _latest_build(client: httpx.AsyncClient, version: str) -> int:
+    """Latest Paper build for a version; concurrent misses share a single request."""
+    build = _cache_get(_versions_cache, version)
+    if build is not None:
+        return build
+    async with _single_flight(("versions", version)):
+        build = _cache_get(_versions_cache, version)
+        if build is not None:
+            return build
+        vr = await client.get(f"/versions/{version}")
+        if vr.status_code == 404:
+            raise HTTPException(status_code=404, detail=f"Paper version {version} not found")
+        vr.raise_for_status()
+        builds = vr.json().get("builds") or []
+        if not builds:
+            raise HTTPException(status_code=404, detail=f"No builds listed for Paper {version}")
+        build = int(builds[-1])
+        _cache_put(_versions_cache, version, build, _VERSIONS_TTL, _VERSIONS_MAX)
+        return build
+
+
+async def _build_jar_name(client: httpx.AsyncClient, version: str, build: int) -> str:
+    """Download file name of a Paper build; concurrent misses share a single request."""
+    key = (version, build)
+    jar_name = _cache_get(_build_cache, key)
+    if jar_name is not None:
+        return jar_name
+    async with _single_flight(("build", version, build)):
+        jar_name = _cache_get(_build_cache, key)
+        if jar_name is not None:
+            return jar_name
+        br = await client.get(f"/versions/{version}/builds/{build}")
+        if br.status_code == 404:
+            raise HTTPException(status_code=404, detail=f"Build {build} for Paper {version} not found")
+        br.raise_for_status()
+        downloads = (br.json().get("downloads") or {}).get("application") or {}
+        jar_name = downloads.get("name") or f"paper-{version}-{build}.jar"
+        _cache_put(_build_cache, key, jar_name, _BUILD_TTL, _BUILD_MAX)
+        return jar_name
+
+
+async def _head_info(client: httpx.AsyncClient, url: str) -> dict[str, object]:
+    try:
+        h = await client.head(url)
+        clen = h.headers.get("content-length")
+        return {
+            "status_code": int(h.status_code),
+            "content_type": h.headers.get("content-type"),
+            "content_length": int(clen) if (clen or "").isdigit() else None,
+        }
+    except Exception:
+        return {"error": "HEAD request failed"}
+
 
 @router.get("/paper")
-def probe_paper(
+async def probe_paper(
     version: str = Query(..., description="Minecraft version, e.g. 1.21.1"),
     build: Optional[int] = Query(None, description="Specific Paper build number; if omitted, latest is used"),
     sample_bytes: int = Query(0, ge=0, le=65536, description="If >0, fetch first N bytes to verify PK header"),
     current_user: User = Depends(require_auth),
+    client: httpx.AsyncClient = Depends(get_paper_client),
 ):
     """Probe PaperMC availability for a given version/build without creating a server.
 
     Returns resolved build, download URL, headers (content-type,length), and optional first bytes.
     """
-    base = "https://api.papermc.io/v2/projects/paper"
+    base = PAPER_API_BASE
     try:
         
         if build is None:
-            vr = requests.get(f"{base}/versions/{version}", timeout=15)
-            if vr.status_code == 404:
-                raise HTTPException(status_code=404, detail=f"Paper version {version} not found")
-            vr.raise_for_status()
-            builds = vr.json().get("builds") or []
-            if not builds:
-                raise HTTPException(status_code=404, detail=f"No builds listed for Paper {version}")
-            build = int(builds[-1])
-
-        br = requests.get(f"{base}/versions/{version}/builds/{build}", timeout=15)
-        if br.status_code == 404:
-            raise HTTPException(status_code=404, detail=f"Build {build} for Paper {version} not found")
-        br.raise_for_status()
-        bdata = br.json()
-        downloads = (bdata.get("downloads") or {}).get("application") or {}
-        jar_name = downloads.get("name") or f"paper-{version}-{build}.jar"
+            build = await _latest_build(client, version)
+
+        # The download name is almost always paper-{version}-{build}.jar, so HEAD that
+        # guess while the build metadata is resolved and only re-HEAD if it differs.
+        guess_url = f"{base}/versions/{version}/builds/{build}/downloads/paper-{version}-{build}.jar"
+        jar_name, head_info = await asyncio.gather(
+            _build_jar_name(client, version, build),
+            _head_info(client, guess_url),
+        )
         url = f"{base}/versions/{version}/builds/{build}/downloads/{jar_name}"
+        if url != guess_url:
+            head_info = await _head_info(client, url)
 
-        
-        head_info: dict[str, object] = {}
         first_bytes_hex = None
         first_bytes_ascii = None
-        try:
-            h = requests.head(url, allow_redirects=True, timeout=15)
-            
-            clen = h.headers.get("content-length")
-            head_info = {
-                "status_code": int(h.status_code),
-                "content_type": h.headers.get("content-type"),
-                "content_length": int(clen) if (clen or "").isdigit() else None,
-            }
-        except Exception:
-            head_info = {"error": "HEAD request failed"}
-
         
         if sample_bytes and sample_bytes > 0:
             try:
-                rg = requests.get(url, headers={"Range": f"bytes=0-{sample_bytes-1}"}, stream=True, timeout=20)
-                rg.raise_for_status()
-                data = b""
-                for chunk in rg.iter_content(chunk_size=min(8192, sample_bytes)):
-                    if not chunk:
-                        break
-                    data += chunk
-                    if len(data) >= sample_bytes:
-                        break
-                first_bytes_hex = data[:sample_bytes].hex()
-                first_bytes_ascii = ''.join(chr(b) if 32 <= b <= 126 else '.' for b in data[:sample_bytes])
+                async with client.stream("GET", url, headers={"Range": f"bytes=0-{sample_bytes-1}"}, timeout=20) as rg:
+                    rg.raise_for_status()
+                    # The server may ignore Range and send the whole jar, so stop once the sample is filled.
+                    buf = bytearray(sample_bytes)
+                    view = memoryview(buf)
+                    pos = 0
+                    async for chunk in rg.aiter_bytes(chunk_size=65536):
+                        n = min(len(chunk), sample_bytes - pos)
+                        view[pos:pos + n] = chunk[:n]
+                        pos += n
+                        if pos >= sample_bytes:
+                            break
+                data = bytes(view[:pos])
+                first_bytes_hex = data.hex()
+                first_bytes_ascii = data.translate(_PRINTABLE).decode("ascii")
                 
                 cr = rg.headers.get("Content-Range") or ""
                 
@@ -4,13 +4,16 @@ WebSocket support, live console streaming, real-time notifications
 """
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
+from sqlalchemy import exists, func, update
 from sqlalchemy.orm import Session
 from typing import List, Dict, Set
 from datetime import datetime
 import json
 import asyncio
 
-from database import get_db
+import orjson
+
+from database import get_db, SessionLocal
 from models import User, Notification
 from auth import get_current_user
 
@@ -19,50 +22,229 @@ router = APIRouter(prefix="/realtime", tags=["realtime"])
 
 # ==================== WebSocket Connection Manager ====================
 
+# Frames buffered per socket before the peer is treated as a slow consumer
+OUTBOX_SIZE = 1000
+
+# Console lines are coalesced into one frame of up to this many lines or
+# whatever arrives within the window after the first line
+CONSOLE_BATCH_LINES = 64
+CONSOLE_BATCH_WINDOW = 0.02
+
+# Console subscription caps; sockets over a limit are closed with 1013
+MAX_SUBS_PER_USER = 50
+MAX_SUBS_PER_SERVER = 500
+MAX_SUBS_TOTAL = 1000
+
+# /ws liveness: ping after this many idle seconds, drop after repeated misses
+IDLE_PING_SECONDS = 30
+MAX_MISSED_PINGS = 3
+
+
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[int, List[WebSocket]] = {}
         self.console_subscribers: Dict[str, Set[WebSocket]] = {}
+        # Flat index of every /ws connection so broadcasts skip the per-user map
+        self._all: Set[WebSocket] = set()
+        self._outboxes: Dict[WebSocket, asyncio.Queue] = {}
+        self._writers: Dict[WebSocket, asyncio.Task] = {}
+        self._console_queues: Dict[str, asyncio.Queue] = {}
+        self._console_flushers: Dict[str, asyncio.Task] = {}
+        # socket -> owning user, and live subscription counts per user
+        self._sub_owner: Dict[WebSocket, int] = {}
+        self._user_subs: Dict[int, int] = {}
+        self._total_subs = 0
     
     async def connect(self, websocket: WebSocket, user_id: int):
         await websocket.accept()
         if user_id not in self.active_connections:
             self.active_connections[user_id] = []
         self.active_connections[user_id].append(websocket)
+        self._all.add(websocket)
+        self._start_writer(websocket)
     
     def disconnect(self, websocket: WebSocket, user_id: int):
+        self._all.discard(websocket)
         if user_id in self.active_connections:
-            self.active_connections[user_id].remove(websocket)
+            if websocket in self.active_connections[user_id]:
+                self.active_connections[user_id].remove(websocket)
             if not self.active_connections[user_id]:
                 del self.active_connections[user_id]
         
         # Remove from console subscriptions
         for server_name in list(self.console_subscribers.keys()):
-            self.console_subscribers[server_name].discard(websocket)
+            self.unsubscribe_from_console(websocket, server_name)
+        self._sub_owner.pop(websocket, None)
+        
+        self._stop_writer(websocket)
+    
+    def _start_writer(self, websocket: WebSocket):
+        if websocket not in self._writers:
+            self._outboxes[websocket] = asyncio.Queue(maxsize=OUTBOX_SIZE)
+            self._writers[websocket] = asyncio.create_task(self._writer_loop(websocket))
+    
+    def _stop_writer(self, websocket: WebSocket):
+        self._outboxes.pop(websocket, None)
+        task = self._writers.pop(websocket, None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+    
+    def _reap(self, websocket: WebSocket):
+        """Forget a socket whose owner is unknown (e.g. after a failed send)"""
+        if websocket not in self._all:
+            self.disconnect(websocket, None)
+            return
+        for user_id, connections in list(self.active_connections.items()):
+            if websocket in connections:
+                self.disconnect(websocket, user_id)
+                return
+        self.disconnect(websocket, None)
+    
+    async def _writer_loop(self, websocket: WebSocket):
+        queue = self._outboxes[websocket]
+        try:
+            while True:
+                payload = await queue.get()
+                await websocket.send_text(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._reap(websocket)
+    
+    def _enqueue(self, websocket: WebSocket, payload: str, drop_oldest: bool = False) -> bool:
+        """Queue a frame for the socket's writer; False if the peer can't keep up"""
+        queue = self._outboxes.get(websocket)
+        if queue is None:
+            return True
+        try:
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            if not drop_oldest:
+                return False
+            # Console output is lossy: shed the oldest line instead of the peer
+            queue.get_nowait()
+            queue.put_nowait(payload)
+        return True
+    
+    async def _close_slow(self, websocket: WebSocket):
+        self._reap(websocket)
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+    
+    async def send_json(self, websocket: WebSocket, message: dict):
+        if not self._enqueue(websocket, orjson.dumps(message).decode()):
+            await self._close_slow(websocket)
     
     async def send_personal_message(self, message: dict, user_id: int):
         if user_id in self.active_connections:
-            for connection in self.active_connections[user_id]:
-                await connection.send_json(message)
+            payload = orjson.dumps(message).decode()
+            for connection in list(self.active_connections[user_id]):
+                if not self._enqueue(connection, payload):
+                    await self._close_slow(connection)
     
     async def broadcast(self, message: dict):
-        for connections in self.active_connections.values():
-            for connection in connections:
-                await connection.send_json(message)
+        # Serialize once; every peer gets the same text frame
+        payload = orjson.dumps(message).decode()
+        slow = [
+            connection for connection in self._all
+            if not self._enqueue(connection, payload)
+        ]
+        for connection in slow:
+            await self._close_slow(connection)
     
     async def broadcast_to_server(self, server_name: str, message: dict):
-        if server_name in self.console_subscribers:
-            for websocket in self.console_subscribers[server_name]:
-                await websocket.send_json(message)
+        subscribers = self.console_subscribers.get(server_name)
+        if not subscribers:
+            return
+        payload = orjson.dumps(message).decode()
+        for websocket in subscribers:
+            self._enqueue(websocket, payload, drop_oldest=True)
     
-    def subscribe_to_console(self, websocket: WebSocket, server_name: str):
+    async def subscribe_to_console(self, websocket: WebSocket, server_name: str, user_id: int) -> bool:
+        subscribers = self.console_subscribers.get(server_name, ())
+        if websocket in subscribers:
+            return True
+        if (
+            self._user_subs.get(user_id, 0) >= MAX_SUBS_PER_USER
+            or len(subscribers) >= MAX_SUBS_PER_SERVER
+            or self._total_subs >= MAX_SUBS_TOTAL
+        ):
+            self.disconnect(websocket, user_id)
+            await websocket.close(code=1013)
+            return False
+        
         if server_name not in self.console_subscribers:
             self.console_subscribers[server_name] = set()
         self.console_subscribers[server_name].add(websocket)
+        self._sub_owner[websocket] = user_id
+        self._user_subs[user_id] = self._user_subs.get(user_id, 0) + 1
+        self._total_subs += 1
+        self._start_writer(websocket)
+        if server_name not in self._console_flushers:
+            self._console_queues[server_name] = asyncio.Queue(maxsize=OUTBOX_SIZE)
+            self._console_flushers[server_name] = asyncio.create_task(
+                self._console_flusher(server_name)
+            )
+        return True
     
     def unsubscribe_from_console(self, websocket: WebSocket, server_name: str):
         if server_name in self.console_subscribers:
-            self.console_subscribers[server_name].discard(websocket)
+            if websocket in self.console_subscribers[server_name]:
+                self.console_subscribers[server_name].discard(websocket)
+                self._release_subscription(websocket)
+            if not self.console_subscribers[server_name]:
+                del self.console_subscribers[server_name]
+                self._console_queues.pop(server_name, None)
+                task = self._console_flushers.pop(server_name, None)
+                if task is not None:
+                    task.cancel()
+    
+    def _release_subscription(self, websocket: WebSocket):
+        self._total_subs -= 1
+        user_id = self._sub_owner.get(websocket)
+        if user_id in self._user_subs:
+            self._user_subs[user_id] -= 1
+            if self._user_subs[user_id] <= 0:
+                del self._user_subs[user_id]
+    
+    def queue_console_line(self, server_name: str, line: str):
+        queue = self._console_queues.get(server_name)
+        if queue is None:
+            return
+        try:
+            queue.put_nowait(line)
+        except asyncio.QueueFull:
+            queue.get_nowait()
+            queue.put_nowait(line)
+    
+    async def _console_flusher(self, server_name: str):
+        queue = self._console_queues[server_name]
+        loop = asyncio.get_running_loop()
+        while True:
+            lines = [await queue.get()]
+            deadline = loop.time() + CONSOLE_BATCH_WINDOW
+            while len(lines) < CONSOLE_BATCH_LINES:
+                try:
+                    lines.append(queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    lines.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            await self.broadcast_to_server(server_name, {
+                'type': 'console_batch',
+                'server_name': server_name,
+                'lines': lines,
+                'timestamp': datetime.utcnow()
+            })
 
 
 manager = ConnectionManager()
@@ -70,33 +252,60 @@ manager = ConnectionManager()
 
 # ==================== WebSocket Endpoints ====================
 
+def _ws_user_id(token: str):
+    """Resolve a websocket token to an active user's id, or None"""
+    # verify_token returns the decoded payload dict, which is unhashable and so
+    # can't key the per-user connection and subscription maps
+    from auth import verify_token, get_user_by_username
+    payload = verify_token(token)
+    username = payload.get("sub") if payload else None
+    if not username:
+        return None
+    db = SessionLocal()
+    try:
+        user = get_user_by_username(db, username)
+        return user.id if user and user.is_active else None
+    finally:
+        db.close()
+
+
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket, token: str):
     """Main WebSocket connection for real-time updates"""
     
     # Authenticate user from token
-    from auth import verify_token
-    user_id = verify_token(token)
+    user_id = _ws_user_id(token)
     if not user_id:
         await websocket.close(code=1008)
         return
     
     await manager.connect(websocket, user_id)
     
+    missed = 0
     try:
         while True:
-            data = await websocket.receive_text()
+            try:
+                data = await asyncio.wait_for(websocket.receive_text(), timeout=IDLE_PING_SECONDS)
+            except asyncio.TimeoutError:
+                missed += 1
+                if missed >= MAX_MISSED_PINGS:
+                    await websocket.close()
+                    return
+                await manager.send_json(websocket, {'type': 'ping'})
+                continue
+            missed = 0
             message = json.loads(data)
             
             # Handle different message types
             if message.get('type') == 'ping':
-                await websocket.send_json({'type': 'pong'})
+                await manager.send_json(websocket, {'type': 'pong'})
             
             elif message.get('type') == 'subscribe_console':
                 server_name = message.get('server_name')
                 if server_name:
-                    manager.subscribe_to_console(websocket, server_name)
-                    await websocket.send_json({
+                    if not await manager.subscribe_to_console(websocket, server_name, user_id):
+                        return
+                    await manager.send_json(websocket, {
                         'type': 'subscribed',
                         'server_name': server_name
                     })
@@ -107,6 +316,9 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                     manager.unsubscribe_from_console(websocket, server_name)
     
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Runs on errors and task cancellation too, not just clean closes
         manager.disconnect(websocket, user_id)
 
 
@@ -114,22 +326,26 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
 async def console_stream(websocket: WebSocket, server_name: str, token: str):
     """Stream console output for a specific server"""
     
-    from auth import verify_token
-    user_id = verify_token(token)
+    user_id = _ws_user_id(token)
     if not user_id:
         await websocket.close(code=1008)
         return
     
     await websocket.accept()
-    manager.subscribe_to_console(websocket, server_name)
+    if not await manager.subscribe_to_console(websocket, server_name, user_id):
+        return
     
     try:
         while True:
-            # Keep connection alive
-            await asyncio.sleep(1)
+            # Output only flows one way; block on the socket so a close
+            # is noticed immediately and incoming frames are discarded
+            await websocket.receive_text()
     
     except WebSocketDisconnect:
-        manager.unsubscribe_from_console(websocket, server_name)
+        pass
+    finally:
+        # Runs on errors and task cancellation too, not just clean closes
+        manager.disconnect(websocket, user_id)
 
 
 # ==================== Notification System ====================
@@ -143,7 +359,15 @@ async def get_notifications(
 ):
     """Get user notifications"""
     
-    query = db.query(Notification).filter(Notification.user_id == current_user.id)
+    query = db.query(Notification).with_entities(
+        Notification.id,
+        Notification.notification_type,
+        Notification.title,
+        Notification.message,
+        Notification.data,
+        Notification.is_read,
+        Notification.created_at,
+    ).filter(Notification.user_id == current_user.id)
     
     if unread_only:
         query = query.filter(Notification.is_read == False)
@@ -151,6 +375,7 @@ async def get_notifications(
     notifications = query.order_by(Notification.created_at.desc()).limit(limit).all()
     
     return {
+        'unread_count': current_user.unread_notifications_count or 0,
         'notifications': [
             {
                 'id': n.id,
@@ -174,18 +399,33 @@ async def mark_notification_read(
 ):
     """Mark notification as read"""
     
-    notification = db.query(Notification).filter(
-        Notification.id == notification_id,
-        Notification.user_id == current_user.id
+    # Flip only unread rows; a single UPDATE ... RETURNING replaces SELECT + write
+    updated = db.execute(
+        update(Notification)
+        .where(
+            Notification.id == notification_id,
+            Notification.user_id == current_user.id,
+            Notification.is_read == False
+        )
+        .values(is_read=True, read_at=func.now())
+        .returning(Notification.id)
     ).first()
     
-    if not notification:
-        raise HTTPException(status_code=404, detail="Notification not found")
+    if updated is None:
+        found = db.query(exists().where(
+            Notification.id == notification_id,
+            Notification.user_id == current_user.id
+        )).scalar()
+        if not found:
+            raise HTTPException(status_code=404, detail="Notification not found")
+        # Already read; nothing to write
+        return {'success': True}
     
-    notification.is_read = True
-    notification.read_at = datetime.utcnow()
+    _decrement_unread_count(db, current_user.id)
     db.commit()
     
+    await _push_unread_count(db, current_user.id)
+    
     return {'success': True}
 
 
@@ -199,13 +439,37 @@ async def mark_all_read(
     db.query(Notification).filter(
         Notification.user_id == current_user.id,
         Notification.is_read == False
-    ).update({'is_read': True, 'read_at': datetime.utcnow()})
+    ).update(
+        {Notification.is_read: True, Notification.read_at: func.now()},
+        synchronize_session=False
+    )
+    db.query(User).filter(User.id == current_user.id).update(
+        {User.unread_notifications_count: 0},
+        synchronize_session=False
+    )
     
     db.commit()
     
+    await _push_unread_count(db, current_user.id)
+    
     return {'success': True}
 
 
+def _decrement_unread_count(db: Session, user_id: int):
+    db.query(User).filter(
+        User.id == user_id,
+        User.unread_notifications_count > 0
+    ).update(
+        {User.unread_notifications_count: User.unread_notifications_count - 1},
+        synchronize_session=False
+    )
+
+
+async def _push_unread_count(db: Session, user_id: int):
+    count = db.query(User.unread_notifications_count).filter(User.id == user_id).scalar()
+    await broadcast_event('notifications_unread', {'count': count or 0}, user_id=user_id)
+
+
 # ==================== Event Broadcasting ====================
 
 async def broadcast_event(event_type: str, data: dict, user_id: int = None):
@@ -215,7 +479,7 @@ async def broadcast_event(event_type: str, data: dict, user_id: int = None):
         'type': 'event',
         'event': event_type,
         'data': data,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': datetime.utcnow()
     }
     
     if user_id:
@@ -227,11 +491,5 @@ async def broadcast_event(event_type: str, data: dict, user_id: int = None):
 async def broadcast_console_output(server_name: str, line: str):
     """Broadcast console output to subscribers"""
     
-    message = {
-        'type': 'console',
-        'server_name': server_name,
-        'line': line,
-        'timestamp': datetime.utcnow().isoformat()
-    }
-    
-    await manager.broadcast_to_server(server_name, message)
+    # Lines are batched per server and sent as 'console_batch' frames
+    manager.queue_console_line(server_name, line)
@@ -2,7 +2,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Optional, List
 from pathlib import Path
-import json, time, hashlib
+import asyncio, json, os, re, time, hashlib
 from auth import require_moderator
 from models import User
 from config import SERVERS_ROOT
@@ -10,8 +10,46 @@ from docker_manager import fix_server_jar
 
 router = APIRouter(prefix="/servers", tags=["server_maintenance"])
 
+# One pass per jar name; the named group that matched gives the server type
+_JAR_RE = re.compile(
+    r"(?P<paper>paper-(?P<pver>\d+(?:\.\d+)+)-\d+\.jar)"
+    r"|(?P<purpur>purpur-(?P<uver>\d+(?:\.\d+)+)-\d+\.jar)"
+    r"|(?P<fabric>fabric-server-launch\.jar)"
+    r"|(?P<neoforge>neoforge-(?P<nver>\d+(?:\.\d+)+).*\.jar)"
+    r"|(?P<forge>forge-(?P<fver>\d+(?:\.\d+)+).*\.jar)",
+    re.IGNORECASE,
+)
+_JAR_VERSION_GROUP = {"paper": "pver", "purpur": "uver", "fabric": None, "neoforge": "nver", "forge": "fver"}
+
+# server dir -> ((dir mtime, server_meta.json mtime, server.jar (mtime_ns, size)), (type, version))
+_detect_cache: dict[str, tuple[tuple, tuple[str | None, str | None]]] = {}
+
 def _detect_type_version(server_dir: Path) -> tuple[str | None, str | None]:
     """Best-effort detection of server type and version from existing files."""
+    try:
+        dir_mtime = server_dir.stat().st_mtime
+    except OSError:
+        return None, None
+    try:
+        meta_mtime = (server_dir / "server_meta.json").stat().st_mtime
+    except OSError:
+        meta_mtime = 0.0
+    # Overwriting server.jar in place leaves the dir mtime alone but can flip the vanilla check
+    try:
+        jar_stat = (server_dir / "server.jar").stat()
+        jar_stamp = (jar_stat.st_mtime_ns, jar_stat.st_size)
+    except OSError:
+        jar_stamp = None
+    key = str(server_dir)
+    stamp = (dir_mtime, meta_mtime, jar_stamp)
+    cached = _detect_cache.get(key)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    result = _detect_type_version_uncached(server_dir)
+    _detect_cache[key] = (stamp, result)
+    return result
+
+def _detect_type_version_uncached(server_dir: Path) -> tuple[str | None, str | None]:
     stype = None
     sver = None
     try:
@@ -27,64 +65,94 @@ def _detect_type_version(server_dir: Path) -> tuple[str | None, str | None]:
         
         jar_files = [p for p in server_dir.glob("*.jar") if p.is_file()]
         
-        jar_files.sort(key=lambda p: (p.name != "server.jar", -p.stat().st_size))
-        import re
-        patterns = [
-            ("paper", re.compile(r"paper-(?P<ver>\d+(?:\.\d+)+)-(?P<build>\d+)\.jar", re.IGNORECASE)),
-            ("purpur", re.compile(r"purpur-(?P<ver>\d+(?:\.\d+)+)-(?P<build>\d+)\.jar", re.IGNORECASE)),
-            ("fabric", re.compile(r"fabric-server-launch\.jar", re.IGNORECASE)),
-            ("forge", re.compile(r"forge-(?P<ver>\d+(?:\.\d+)+).*\.jar", re.IGNORECASE)),
-            ("neoforge", re.compile(r"neoforge-(?P<ver>\d+(?:\.\d+)+).*\.jar", re.IGNORECASE)),
-        ]
+        sizes = {p: p.stat().st_size for p in jar_files}
+        jar_files.sort(key=lambda p: (p.name != "server.jar", -sizes[p]))
         for jf in jar_files:
-            lower = jf.name.lower()
-            for t, rgx in patterns:
-                m = rgx.search(lower)
-                if m:
-                    stype = stype or t
-                    v = m.groupdict().get("ver")
-                    if v:
-                        sver = sver or v
-                    break
+            m = _JAR_RE.search(jf.name)
+            if m:
+                t = m.lastgroup
+                stype = stype or t
+                ver_group = _JAR_VERSION_GROUP[t]
+                if ver_group:
+                    sver = sver or m.group(ver_group)
             if stype:
                 break
         
-        if not stype and (server_dir / "server.jar").exists() and (server_dir / "server.jar").stat().st_size > 50_000:
+        server_jar = server_dir / "server.jar"
+        if not stype and sizes.get(server_jar, 0) > 50_000:
             stype = "vanilla"
     except Exception:
         pass
     return stype, sver
 
+def _list_jars(path: Path) -> list[str]:
+    try:
+        with os.scandir(path) as it:
+            return [e.name for e in it if e.name.endswith(".jar")]
+    except FileNotFoundError:
+        return []
+
+def _move_into(src: Path, dest_dir: Path) -> None:
+    if not dest_dir.is_dir():
+        dest_dir.mkdir(parents=True, exist_ok=True)
+    os.replace(src, dest_dir / src.name)
+
+def _restore_from_disabled(server_dir: Path, mod_name: str) -> str | None:
+    """Move mod_name back into mods/ from the first disabled folder holding it; returns that folder."""
+    for folder in ["mods-disabled-client", "mods-disabled-crash", "mods-disabled-incompatible"]:
+        disabled_dir = server_dir / folder
+        try:
+            with os.scandir(disabled_dir) as it:
+                found = any(e.name == mod_name for e in it)
+        except FileNotFoundError:
+            continue
+        if found:
+            # Same filesystem, so a single atomic rename
+            _move_into(disabled_dir / mod_name, server_dir / "mods")
+            return folder
+    return None
+
 def _sha256(path: Path) -> str | None:
     try:
-        h = hashlib.sha256()
         with open(path, "rb") as f:
-            for chunk in iter(lambda: f.read(8192), b""):
-                if not chunk:
-                    break
-                h.update(chunk)
-        return h.hexdigest()
+            if hasattr(hashlib, "file_digest"):
+                return hashlib.file_digest(f, "sha256").hexdigest()
+            # Python < 3.11: large reads into one reused buffer
+            h = hashlib.sha256()
+            buf = bytearray(1 << 20)
+            view = memoryview(buf)
+            while n := f.readinto(buf):
+                h.update(view[:n])
+            return h.hexdigest()
     except Exception:
         return None
 
 @router.post("/{server_name}/repair-jar")
-def repair_server_jar(server_name: str, current_user: User = Depends(require_moderator)):
+async def repair_server_jar(server_name: str, current_user: User = Depends(require_moderator)):
     server_dir = SERVERS_ROOT / server_name
     if not server_dir.exists():
         raise HTTPException(status_code=404, detail="Server directory not found")
 
     jar_path = server_dir / "server.jar"
-    before_size = jar_path.stat().st_size if jar_path.exists() else 0
+    try:
+        before_size = os.stat(jar_path).st_size
+    except FileNotFoundError:
+        before_size = 0
     stype, sver = _detect_type_version(server_dir)
     if not stype or not sver:
         raise HTTPException(status_code=400, detail="Cannot repair: missing detected server type/version")
 
     try:
-        fix_server_jar(server_dir, stype, sver)
+        # Downloads and hashing run on worker threads so the loop stays free
+        await asyncio.to_thread(fix_server_jar, server_dir, stype, sver)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Repair attempt failed: {e}")
 
-    if not jar_path.exists() or jar_path.stat().st_size < 100*1024:
+    try:
+        jar_size = os.stat(jar_path).st_size
+    except FileNotFoundError:
+        raise HTTPException(status_code=500, detail="Repaired jar still invalid (missing)")
+    if jar_size < 100*1024:
         raise HTTPException(status_code=500, detail="Repaired jar still invalid (size below threshold)")
 
     
@@ -98,12 +166,12 @@ def repair_server_jar(server_name: str, current_user: User = Depends(require_mod
     meta.update({
         "detected_type": stype,
         "detected_version": sver,
-        "jar_size_bytes": jar_path.stat().st_size,
-        "jar_sha256": _sha256(jar_path),
+        "jar_size_bytes": jar_size,
+        "jar_sha256": await asyncio.to_thread(_sha256, jar_path),
         "last_repair_ts": int(time.time()),
     })
     try:
-        meta_path.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        await asyncio.to_thread(meta_path.write_text, json.dumps(meta, indent=2), encoding="utf-8")
     except Exception:
         pass
 
@@ -113,7 +181,7 @@ def repair_server_jar(server_name: str, current_user: User = Depends(require_mod
         "type": stype,
         "version": sver,
         "previous_size": before_size,
-        "new_size": jar_path.stat().st_size,
+        "new_size": jar_size,
         "sha256": meta.get("jar_sha256"),
     }
 
@@ -221,7 +289,11 @@ def purge_client_only_mods(
         
         
         disabled_dir = server_dir / "mods-disabled-client"
-        moved_count = len(list(disabled_dir.glob("*.jar"))) if disabled_dir.exists() else 0
+        try:
+            with os.scandir(disabled_dir) as it:
+                moved_count = sum(1 for e in it if e.name.endswith(".jar"))
+        except FileNotFoundError:
+            moved_count = 0
         
         return {
             "message": f"Purged client-only mods",
@@ -254,15 +326,13 @@ def list_disabled_mods(server_name: str, current_user: User = Depends(require_mo
         ("disabled_crash", "mods-disabled-crash"),
         ("disabled_incompatible", "mods-disabled-incompatible"),
     ]:
-        disabled_dir = server_dir / folder
-        if disabled_dir.exists():
-            result[category] = [f.name for f in disabled_dir.glob("*.jar")]
+        result[category] = _list_jars(server_dir / folder)
     
     return result
 
 
 @router.post("/{server_name}/restore-mod")
-def restore_disabled_mod(
+async def restore_disabled_mod(
     server_name: str,
     mod_name: str,
     current_user: User = Depends(require_moderator)
@@ -274,21 +344,13 @@ def restore_disabled_mod(
     if not server_dir.exists():
         raise HTTPException(status_code=404, detail="Server directory not found")
     
-    mods_dir = server_dir / "mods"
-    mods_dir.mkdir(parents=True, exist_ok=True)
-    
-    
-    for folder in ["mods-disabled-client", "mods-disabled-crash", "mods-disabled-incompatible"]:
-        disabled_dir = server_dir / folder
-        mod_path = disabled_dir / mod_name
-        if mod_path.exists():
-            import shutil
-            dest = mods_dir / mod_name
-            shutil.move(str(mod_path), str(dest))
-            return {
-                "message": f"Restored {mod_name} to mods folder",
-                "server": server_name,
-                "restored_from": folder,
-            }
+    # Lookup and move both touch the filesystem, so run them off the event loop together
+    folder = await asyncio.to_thread(_restore_from_disabled, server_dir, mod_name)
+    if folder:
+        return {
+            "message": f"Restored {mod_name} to mods folder",
+            "server": server_name,
+            "restored_from": folder,
+        }
     
     raise HTTPException(status_code=404, detail=f"Mod {mod_name} not found in disabled folders")
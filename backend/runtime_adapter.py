@@ -1,17 +1,48 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Any
+from typing import Dict, List, Optional, Set, Any, Tuple
 import re
 import json
 import time
+from datetime import datetime as _datetime
 import psutil
 
 from local_runtime import LocalRuntimeManager, MINECRAFT_PORT
 from config import SERVERS_ROOT
 
+# Docker support is optional in local mode; remember why it is missing
+try:
+    from docker_manager import DockerManager as _DockerManager
+    _DOCKER_IMPORT_ERROR: Optional[Exception] = None
+except Exception as _exc:
+    _DockerManager = None
+    _DOCKER_IMPORT_ERROR = _exc
+
+
+# Hot per-server paths are built with os.path on a cached root string
+_SERVERS_ROOT_STR = str(SERVERS_ROOT)
+
+
+def _server_dir(name: str) -> str:
+    return os.path.join(_SERVERS_ROOT_STR, name)
+
+
+def _meta_path(name: str) -> str:
+    return os.path.join(_SERVERS_ROOT_STR, name, "server_meta.json")
+
 
 _RAM_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGTP]?)(?:I?B)?\s*$", re.IGNORECASE)
 
+_RAM_FACTORS = {
+    '': 1.0,
+    'K': 1.0 / 1024.0,
+    'M': 1.0,
+    'G': 1024.0,
+    'T': 1024.0 * 1024.0,
+    'P': 1024.0 * 1024.0 * 1024.0,
+}
+
 
 def _parse_ram_to_mb(value: object, default_mb: float) -> float:
     try:
@@ -19,24 +50,31 @@ def _parse_ram_to_mb(value: object, default_mb: float) -> float:
             return default_mb
         if isinstance(value, (int, float)):
             return float(value)
-        raw = str(value).strip()
+        raw = str(value).strip().upper()
         if not raw:
             return default_mb
-        m = _RAM_PATTERN.match(raw)
-        if not m:
-            return default_mb
-        number = float(m.group(1))
-        unit = (m.group(2) or '').upper()
-        factors = {
-            '': 1.0,
-            'K': 1.0 / 1024.0,
-            'M': 1.0,
-            'G': 1024.0,
-            'T': 1024.0 * 1024.0,
-            'P': 1024.0 * 1024.0 * 1024.0,
-        }
-        factor = factors.get(unit, 1.0)
-        mb_val = number * factor
+        # Fast path for the usual "2048", "2G", "1024M", "4GB" forms
+        i = 0
+        while i < len(raw) and (raw[i].isdigit() or raw[i] == '.'):
+            i += 1
+        number = None
+        unit = ''
+        if 0 < i and raw[0] != '.' and raw[i - 1] != '.' and raw.count('.', 0, i) <= 1:
+            rest = raw[i:]
+            if not rest:
+                number = float(raw)
+            elif rest[0] in _RAM_FACTORS and rest[1:] in ('', 'B', 'IB'):
+                number = float(raw[:i])
+                unit = rest[0]
+            elif rest in ('B', 'IB'):
+                number = float(raw[:i])
+        if number is None:
+            m = _RAM_PATTERN.match(raw)
+            if not m:
+                return default_mb
+            number = float(m.group(1))
+            unit = m.group(2) or ''
+        mb_val = number * _RAM_FACTORS.get(unit, 1.0)
         if mb_val <= 0:
             return default_mb
         return mb_val
@@ -44,6 +82,21 @@ def _parse_ram_to_mb(value: object, default_mb: float) -> float:
         return default_mb
 
 
+def _tail_file(path: str, n: int, block: int = 65536) -> str:
+    """Last n lines of a file, reading backwards from EOF in blocks."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        buf = b""
+        while pos > 0 and buf.count(b"\n") <= n:
+            chunk_size = min(block, pos)
+            pos -= chunk_size
+            f.seek(pos)
+            buf = f.read(chunk_size) + buf
+    lines = buf.decode("utf-8", errors="ignore").splitlines()
+    return "\n".join(lines[-n:])
+
+
 def _gather_process_tree(pid: int) -> List[psutil.Process]:
     procs: List[psutil.Process] = []
     try:
@@ -58,6 +111,13 @@ def _gather_process_tree(pid: int) -> List[psutil.Process]:
     return procs
 
 
+# Re-walk a server's process children every N stats samples
+_PROC_TREE_REFRESH = 10
+
+# How long a steam container index from Docker is trusted
+_STEAM_INDEX_TTL = 5.0
+
+
 class LocalAdapter:
     """DockerManager-compatible adapter for LocalRuntimeManager."""
 
@@ -65,16 +125,72 @@ class LocalAdapter:
         self.local = LocalRuntimeManager()
         self._docker = None
         self._steam_index: Dict[str, Dict[str, Any]] = {}
+        self._steam_index_ts = 0.0
+        # (monotonic ts, list_servers() result) reused by bulk stats polling
+        self._list_cache: Optional[Tuple[float, List[Dict]]] = None
+        # server name -> (server_meta.json st_mtime_ns, parsed meta)
+        self._meta_cache: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        # server name -> (root pid, process tree, samples since the tree was walked).
+        # Keeping the psutil objects lets cpu_percent() measure against the
+        # previous sample instead of sleeping for an interval.
+        self._proc_cache: Dict[str, Tuple[int, List[psutil.Process], int]] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
 
     def _get_docker(self):
         if self._docker is None:
-            try:
-                from docker_manager import DockerManager  
-            except Exception as exc:
-                raise RuntimeError(f"Docker manager unavailable: {exc}")
-            self._docker = DockerManager()
+            if _DockerManager is None:
+                raise RuntimeError(f"Docker manager unavailable: {_DOCKER_IMPORT_ERROR}")
+            self._docker = _DockerManager()
         return self._docker
 
+    def _read_meta(self, name: str) -> Dict[str, Any]:
+        """Parsed server_meta.json for a server ({} if missing); treat as read-only."""
+        path = _meta_path(name)
+        try:
+            key = os.stat(path).st_mtime_ns
+        except OSError:
+            self._meta_cache.pop(name, None)
+            return {}
+        cached = self._meta_cache.get(name)
+        if cached and cached[0] == key:
+            return cached[1]
+        try:
+            with open(path, encoding="utf-8") as f:
+                meta = json.loads(f.read() or "{}")
+        except Exception:
+            meta = {}
+        if not isinstance(meta, dict):
+            meta = {}
+        self._meta_cache[name] = (key, meta)
+        return meta
+
+    def _process_tree(self, container_id: str, pid: int) -> List[psutil.Process]:
+        cached = self._proc_cache.get(container_id)
+        if cached and cached[0] == pid:
+            _, procs, samples = cached
+            try:
+                alive = procs[0].is_running()
+            except Exception:
+                alive = False
+            if alive:
+                samples += 1
+                if samples >= _PROC_TREE_REFRESH:
+                    samples = 0
+                    known = {pr.pid: pr for pr in procs}
+                    try:
+                        children = procs[0].children(recursive=True)
+                        procs = [procs[0]] + [known.get(c.pid, c) for c in children]
+                    except Exception:
+                        pass
+                self._proc_cache[container_id] = (pid, procs, samples)
+                return procs
+        procs = _gather_process_tree(pid)
+        if procs:
+            self._proc_cache[container_id] = (pid, procs, 0)
+        else:
+            self._proc_cache.pop(container_id, None)
+        return procs
+
     def _refresh_steam_index(self, entries: List[Dict[str, Any]]) -> None:
         index: Dict[str, Dict[str, Any]] = {}
         for entry in entries:
@@ -89,37 +205,43 @@ class LocalAdapter:
             if name:
                 index[name] = entry
         self._steam_index = index
+        self._steam_index_ts = time.monotonic()
+
+    def _prime_steam_index(self) -> None:
+        """Index steam containers with one filtered list call instead of a get per id."""
+        entries: List[Dict[str, Any]] = []
+        try:
+            docker = self._get_docker()
+            containers = docker.client.containers.list(all=True, filters={"label": "steam.server=true"})
+            for container in containers:
+                entries.append({
+                    "id": container.id,
+                    "name": getattr(container, "name", container.id),
+                    "status": getattr(container, "status", "unknown"),
+                    "server_kind": "steam",
+                })
+        except Exception:
+            entries = []
+        # Stamp even on failure so an unreachable Docker isn't retried on every call
+        self._refresh_steam_index(entries)
 
     def _resolve_steam_id(self, container_id: str) -> Optional[str]:
         if not container_id:
             return None
+        if time.monotonic() - self._steam_index_ts >= _STEAM_INDEX_TTL:
+            self._prime_steam_index()
         cached = self._steam_index.get(container_id)
         if cached and str(cached.get("server_kind", "")).lower() == "steam":
             return str(cached.get("id"))
-        try:
-            docker = self._get_docker()
-        except Exception:
-            return None
-        try:
-            container = docker.client.containers.get(container_id)
-        except Exception:
-            return None
-        labels = (container.attrs.get("Config", {}) or {}).get("Labels", {}) or {}
-        if str(labels.get("steam.server", "")).lower() == "true":
-            identifier = container.id
-            data = {
-                "id": identifier,
-                "name": getattr(container, "name", container_id),
-                "status": getattr(container, "status", "unknown"),
-                "server_kind": "steam",
-            }
-            self._steam_index[identifier] = data
-            self._steam_index[data["name"]] = data
-            return identifier
         return None
 
     
     def list_servers(self) -> List[Dict]:
+        items = self._list_servers_uncached()
+        self._list_cache = (time.monotonic(), items)
+        return items
+
+    def _list_servers_uncached(self) -> List[Dict]:
         items = self.local.list_servers()
         for it in items:
             it.setdefault("server_kind", "minecraft")
@@ -134,20 +256,18 @@ class LocalAdapter:
             
             try:
                 if name:
-                    meta_path = (SERVERS_ROOT / str(name) / "server_meta.json")
-                    if meta_path.exists():
-                        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+                    meta = self._read_meta(str(name))
+                    if meta:
                         lbl = it.get("labels") or {}
-                        if isinstance(meta, dict):
-                            prov = meta.get("modpack_provider")
-                            pid = meta.get("modpack_id")
-                            ver = meta.get("modpack_version_id")
-                            if prov:
-                                lbl["mc.modpack.provider"] = str(prov)
-                            if pid:
-                                lbl["mc.modpack.id"] = str(pid)
-                            if ver:
-                                lbl["mc.modpack.version_id"] = str(ver)
+                        prov = meta.get("modpack_provider")
+                        pid = meta.get("modpack_id")
+                        ver = meta.get("modpack_version_id")
+                        if prov:
+                            lbl["mc.modpack.provider"] = str(prov)
+                        if pid:
+                            lbl["mc.modpack.id"] = str(pid)
+                        if ver:
+                            lbl["mc.modpack.version_id"] = str(ver)
                         it["labels"] = lbl
             except Exception:
                 pass
@@ -167,11 +287,8 @@ class LocalAdapter:
         except Exception:
             steam_entries = []
 
-        if steam_entries:
-            self._refresh_steam_index(steam_entries)
-            items.extend(steam_entries)
-        else:
-            self._steam_index = {}
+        self._refresh_steam_index(steam_entries)
+        items.extend(steam_entries)
         return items
 
     def create_server(
@@ -187,6 +304,7 @@ class LocalAdapter:
         extra_env: Optional[Dict[str, str]] = None,
         extra_labels: Optional[Dict[str, str]] = None,
     ) -> Dict:
+        self._list_cache = None
         result = self.local.create_server(
             name,
             server_type,
@@ -208,7 +326,7 @@ class LocalAdapter:
                 if "mc.modpack.version_id" in extra_labels:
                     meta_updates["modpack_version_id"] = extra_labels.get("mc.modpack.version_id")
                 if meta_updates:
-                    self.local.update_metadata(name, **meta_updates)
+                    self.update_metadata(name, **meta_updates)
         except Exception:
             pass
         return result
@@ -222,6 +340,7 @@ class LocalAdapter:
         extra_env: Optional[Dict[str, str]] = None,
         extra_labels: Optional[Dict[str, str]] = None,
     ) -> Dict:
+        self._list_cache = None
         result = self.local.create_server_from_existing(
             name,
             host_port=host_port,
@@ -241,18 +360,20 @@ class LocalAdapter:
                 if "mc.modpack.version_id" in extra_labels:
                     meta_updates["modpack_version_id"] = extra_labels.get("mc.modpack.version_id")
                 if meta_updates:
-                    self.local.update_metadata(name, **meta_updates)
+                    self.update_metadata(name, **meta_updates)
         except Exception:
             pass
         return result
 
     def stop_server(self, container_id: str) -> Dict:
+        self._list_cache = None
         steam_id = self._resolve_steam_id(container_id)
         if steam_id:
             return self._get_docker().stop_server(steam_id)
         return self.local.stop_server(container_id)
 
     def start_server(self, container_id: str) -> Dict:
+        self._list_cache = None
         
         
         steam_id = self._resolve_steam_id(container_id)
@@ -261,6 +382,7 @@ class LocalAdapter:
         return self.local.create_server_from_existing(container_id, min_ram=None, max_ram=None)
 
     def restart_server(self, container_id: str) -> Dict:
+        self._list_cache = None
         
         try:
             steam_id = self._resolve_steam_id(container_id)
@@ -276,18 +398,22 @@ class LocalAdapter:
         return self.local.create_server_from_existing(container_id, min_ram=None, max_ram=None)
 
     def kill_server(self, container_id: str) -> Dict:
+        self._list_cache = None
         steam_id = self._resolve_steam_id(container_id)
         if steam_id:
             return self._get_docker().kill_server(steam_id)
         return self.local.stop_server(container_id)
 
     def delete_server(self, container_id: str) -> Dict:
+        self._list_cache = None
         steam_id = self._resolve_steam_id(container_id)
         if steam_id:
+            self._steam_index_ts = 0.0
             return self._get_docker().delete_server(steam_id)
         return self.local.stop_server(container_id)
 
     def update_metadata(self, container_id: str, **fields: Any) -> None:
+        self._meta_cache.pop(container_id, None)
         self.local.update_metadata(container_id, **fields)
 
     
@@ -295,10 +421,10 @@ class LocalAdapter:
         steam_id = self._resolve_steam_id(container_id)
         if steam_id:
             return self._get_docker().get_server_stats(steam_id)
-        p = (SERVERS_ROOT / container_id).resolve()
         pid = None
         try:
-            pid_txt = (p / ".server.pid").read_text().strip()
+            with open(os.path.join(_server_dir(container_id), ".server.pid")) as f:
+                pid_txt = f.read().strip()
             pid = int(pid_txt) if pid_txt else None
         except Exception:
             pid = None
@@ -311,25 +437,19 @@ class LocalAdapter:
         net_tx_mb = 0.0
 
         try:
-            meta_path = (p / "server_meta.json")
-            if meta_path.exists():
-                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            meta = self._read_meta(container_id)
+            if meta:
                 mem_limit_mb = _parse_ram_to_mb(meta.get("max_ram_mb") or meta.get("max_ram"), mem_limit_mb)
         except Exception:
             pass
 
         if pid and psutil.pid_exists(pid):
             try:
-                procs = _gather_process_tree(pid)
+                procs = self._process_tree(container_id, pid)
                 if not procs:
                     procs = [psutil.Process(pid)]
                 
-                for pr in procs:
-                    try:
-                        pr.cpu_percent(interval=None)
-                    except Exception:
-                        continue
-                time.sleep(0.15)
+                # First sample of a new process reads 0.0 and primes psutil's baseline
                 total_cpu = 0.0
                 total_mem = 0
                 total_rx = 0
@@ -362,6 +482,8 @@ class LocalAdapter:
                     mem_percent = (mem_usage_mb / mem_limit_mb) * 100.0
             except Exception:
                 pass
+        else:
+            self._proc_cache.pop(container_id, None)
 
         if mem_limit_mb <= 0:
             mem_limit_mb = max(mem_usage_mb, 1.0)
@@ -378,11 +500,22 @@ class LocalAdapter:
 
     def get_bulk_server_stats(self, ttl_seconds: int = 3) -> Dict:
         results: Dict[str, Dict] = {}
-        for it in self.list_servers():
-            container_id = it.get("id") or it.get("name")
-            if not container_id:
-                continue
-            results[container_id] = self.get_server_stats(str(container_id))
+        cached = self._list_cache
+        if cached is not None and time.monotonic() - cached[0] < ttl_seconds:
+            servers = cached[1]
+        else:
+            servers = self.list_servers()
+        ids = [str(cid) for cid in (it.get("id") or it.get("name") for it in servers) if cid]
+        if not ids:
+            return results
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="lynx-stats")
+        # Each worker only touches its own server's cache entries, and single
+        # dict reads/writes are atomic, so the caches need no extra locking
+        futures = [(cid, self._pool.submit(self.get_server_stats, cid)) for cid in ids]
+        # Collect in listing order so the result matches the serial version
+        for cid, fut in futures:
+            results[cid] = fut.result()
         return results
 
     def get_player_info(self, container_id: str) -> Dict:
@@ -516,15 +649,8 @@ class LocalAdapter:
             info = self._get_docker().get_server_info(steam_id)
             info.setdefault("server_kind", "steam")
             return info
-        p = (SERVERS_ROOT / container_id).resolve()
-        exists = p.exists()
-        meta: Dict[str, Any] = {}
-        try:
-            mp = p / "server_meta.json"
-            if mp.exists():
-                meta = json.loads(mp.read_text(encoding="utf-8"))
-        except Exception:
-            meta = {}
+        exists = os.path.exists(_server_dir(container_id))
+        meta = self._read_meta(container_id)
 
         host_port = meta.get("host_port") or MINECRAFT_PORT
         server_type = meta.get("type")
@@ -535,8 +661,7 @@ class LocalAdapter:
             epoch_source = meta.get("created_ts") or meta.get("container_created_ts")
             if epoch_source:
                 try:
-                    from datetime import datetime
-                    created_at = datetime.utcfromtimestamp(int(epoch_source))
+                    created_at = _datetime.utcfromtimestamp(int(epoch_source))
                 except Exception:
                     created_at = None
         java_version = meta.get("java_version", "unknown")
@@ -581,13 +706,7 @@ class LocalAdapter:
 
             
             
-            try:
-                meta_path = (SERVERS_ROOT / container_id / "server_meta.json")
-                meta = {}
-                if meta_path.exists():
-                    meta = json.loads(meta_path.read_text(encoding="utf-8") or "{}")
-            except Exception:
-                meta = {}
+            meta = self._read_meta(container_id)
 
             stored_overrides = meta.get("env_overrides") or {}
             if not isinstance(stored_overrides, dict):
@@ -603,7 +722,7 @@ class LocalAdapter:
             try:
                 
                 
-                self.local.update_metadata(container_id, env_overrides=merged, java_version=str(java_version))
+                self.update_metadata(container_id, env_overrides=merged, java_version=str(java_version))
             except Exception:
                 pass
 
@@ -632,11 +751,7 @@ class LocalAdapter:
             if len(normalized) > 4096:
                 raise ValueError("java_args too long (max 4096 characters when normalized)")
 
-            meta_path = (SERVERS_ROOT / container_id / "server_meta.json")
-            try:
-                meta = json.loads(meta_path.read_text(encoding="utf-8") or "{}") if meta_path.exists() else {}
-            except Exception:
-                meta = {}
+            meta = self._read_meta(container_id)
 
             stored_overrides = meta.get("env_overrides") or {}
             if not isinstance(stored_overrides, dict):
@@ -648,7 +763,7 @@ class LocalAdapter:
                 merged.pop("JAVA_OPTS", None)
 
             try:
-                self.local.update_metadata(container_id, env_overrides=merged)
+                self.update_metadata(container_id, env_overrides=merged)
             except Exception:
                 pass
 
@@ -683,13 +798,15 @@ class LocalAdapter:
                 return logs
             except Exception:
                 return {"id": container_id, "logs": ""}
-        log_path = (SERVERS_ROOT / container_id / "server.stdout.log").resolve()
+        log_path = os.path.join(_server_dir(container_id), "server.stdout.log")
         try:
-            if not log_path.exists():
-                return {"id": container_id, "logs": ""}
-            lines = log_path.read_text(encoding="utf-8", errors="ignore").splitlines()
-            tail_lines = lines[-tail:] if tail and tail > 0 else lines
-            return {"id": container_id, "logs": "\n".join(tail_lines)}
+            if tail and tail > 0:
+                return {"id": container_id, "logs": _tail_file(log_path, tail)}
+            with open(log_path, encoding="utf-8", errors="ignore") as f:
+                lines = f.read().splitlines()
+            return {"id": container_id, "logs": "\n".join(lines)}
+        except FileNotFoundError:
+            return {"id": container_id, "logs": ""}
         except Exception:
             return {"id": container_id, "logs": ""}
 
@@ -703,9 +820,10 @@ class LocalAdapter:
         steam_id = self._resolve_steam_id(container_id)
         if steam_id:
             return self._get_docker().send_command(steam_id, command)
-        fifo_path = (SERVERS_ROOT / container_id / "console.in").resolve()
+        fifo_path = os.path.join(_server_dir(container_id), "console.in")
         try:
-            if not fifo_path.exists():
+            # Checked first: opening a missing path for writing would create a plain file
+            if not os.path.exists(fifo_path):
                 return {"id": container_id, "ok": False, "error": "Console pipe not available"}
             data = (command or '').strip()
             if not data:
@@ -716,6 +834,24 @@ class LocalAdapter:
         except Exception as e:
             return {"id": container_id, "ok": False, "error": str(e)}
 
+    def send_commands(self, container_id: str, commands: List[str]) -> List[Dict]:
+        steam_id = self._resolve_steam_id(container_id)
+        if steam_id:
+            return self._get_docker().send_commands(steam_id, commands)
+        fifo_path = os.path.join(_server_dir(container_id), "console.in")
+        lines = [(command or '').strip() for command in commands]
+        try:
+            if not os.path.exists(fifo_path):
+                return [{"id": container_id, "ok": False, "error": "Console pipe not available"} for _ in lines]
+            with open(fifo_path, 'w', encoding='utf-8') as f:
+                f.write("".join(line + "\n" for line in lines if line))
+            return [
+                {"id": container_id, "ok": True} if line else {"id": container_id, "ok": False, "error": "Empty command"}
+                for line in lines
+            ]
+        except Exception as e:
+            return [{"id": container_id, "ok": False, "error": str(e)} for _ in lines]
+
     
     def rename_server(self, old_name: str, new_name: str) -> Dict:
         """Rename a local-runtime server directory and restart under the new name.
@@ -726,6 +862,7 @@ class LocalAdapter:
         - Update server_meta.json (name + previous_names)
         - Recreate the local server process preserving RAM and env_overrides
         """
+        self._list_cache = None
         old_dir = (SERVERS_ROOT / old_name).resolve()
         new_dir = (SERVERS_ROOT / new_name).resolve()
         if not old_dir.exists() or not old_dir.is_dir():
@@ -740,13 +877,7 @@ class LocalAdapter:
             pass
 
         
-        meta_path = old_dir / "server_meta.json"
-        meta = {}
-        if meta_path.exists():
-            try:
-                meta = json.loads(meta_path.read_text(encoding="utf-8") or "{}")
-            except Exception:
-                meta = {}
+        meta = self._read_meta(old_name)
         try:
             _min_mb = meta.get("min_ram_mb")
             min_ram = meta.get("min_ram") or (f"{int(_min_mb)}M" if isinstance(_min_mb, (int, float, str)) and str(_min_mb).isdigit() else None)
@@ -774,6 +905,8 @@ class LocalAdapter:
             (new_dir / "server_meta.json").write_text(json.dumps(new_meta), encoding="utf-8")
         except Exception:
             pass
+        self._meta_cache.pop(old_name, None)
+        self._meta_cache.pop(new_name, None)
 
         
         try:
@@ -821,7 +954,8 @@ def get_runtime_manager_or_docker():
         _adapter_cache = adapter
         return adapter
 
-    from docker_manager import DockerManager  
+    if _DockerManager is None:
+        raise RuntimeError(f"Docker manager unavailable: {_DOCKER_IMPORT_ERROR}")
 
-    _adapter_cache = DockerManager()
+    _adapter_cache = _DockerManager()
     return _adapter_cache
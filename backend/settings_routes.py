@@ -155,6 +155,10 @@ def send_notification(event_type: str, title: str, message: str, color: int = 58
                     data={"color": color, "event_type": event_type},
                 )
                 db.add(notif)
+            db.query(User).filter(User.is_active == True).update(
+                {User.unread_notifications_count: User.unread_notifications_count + 1},
+                synchronize_session=False
+            )
             db.commit()
         except Exception as db_err:
             db.rollback()
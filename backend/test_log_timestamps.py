@@ -0,0 +1,29 @@
+from pathlib import Path
+import calendar
+import importlib
+import sys
+
+
+here = Path(__file__).resolve()
+backend_dir = here.parent
+if str(backend_dir) not in sys.path:
+    sys.path.insert(0, str(backend_dir))
+
+player_routes = importlib.import_module('player_routes')
+
+
+def test_date_form_wins_over_bracket_clock():
+    midnight = calendar.timegm((2025, 1, 1, 0, 0, 0, 0, 0, 0))
+    line = '[08:15:00] [Server thread/INFO]: backup at 2025-11-10 12:34:56 done'
+
+    ts = player_routes._parse_log_timestamp(line, midnight)
+
+    assert ts == calendar.timegm((2025, 11, 10, 12, 34, 56, 0, 0, 0))
+
+
+def test_bracket_clock_uses_midnight_epoch():
+    midnight = calendar.timegm((2025, 1, 1, 0, 0, 0, 0, 0, 0))
+    line = '[08:15:00] [Server thread/INFO]: Steve joined the game'
+
+    assert player_routes._parse_log_timestamp(line, midnight) == midnight + 8 * 3600 + 15 * 60
+    assert player_routes._parse_log_timestamp(line, None) is None